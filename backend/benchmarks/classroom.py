@@ -0,0 +1,263 @@
+"""Нагрузочный сценарий урока: преподаватель входит, создает задание с N тестами и сессию,
+M учеников подключаются, преподаватель начинает сессию, и все разом отправляют решения к дедлайну,
+затем ждут вердиктов.
+
+Печатает пропускную способность и p50/p95/p99 по каждому эндпоинту и время от отправки до вердикта.
+Нужны локальные Postgres и Redis из .env - лучше отдельные (DB_NAME=bench, REDIS_URL=.../15):
+бенчмарк создает данные и забирает задачи из общей очереди проверки.
+
+Запуск из каталога backend/:
+    python -m benchmarks.classroom --students 200 --tests 20                   # API в процессе, фейковая песочница
+    python -m benchmarks.classroom --students 30 --sandbox docker              # настоящие контейнеры
+    python -m benchmarks.classroom --base-url http://127.0.0.1:8000 --sandbox external  # уже запущенные сервер и воркеры
+
+--sandbox fake подменяет только контейнеры: очередь, воркер, checker и запись результатов - настоящие.
+HTTP-клиент - httpx: pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from benchmarks.stats import Recorder, compare, print_table, save, summarize
+from backend.docker_lib_nekit.docker_sandbox import sandbox
+from src.config import settings
+
+
+SOLUTION = "a, b = map(int, input().split())\nprint(a + b)\n"
+PASSWORD = "bench-password"
+
+
+class FakeContainer:
+    """Стенд-ин Python-контейнера: отвечает как эталонное решение (a + b), тратя delay секунд на тест"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def judge(self, code: str, tests: list[tuple[str, str | None]], time_limit: float = 2.0,
+              memory_limit: int = 256, compare=None) -> list[sandbox.TestRun]:
+        runs = []
+        for test_input, _ in tests:
+            # блокирующий вызов, как exec в docker: занимает поток пула песочницы
+            time.sleep(self.delay)
+            output = f"{sum(map(int, test_input.split()))}\n"
+            runs.append(sandbox.TestRun(sandbox.Verdict.OK, output, None, time=self.delay, cpu_time=self.delay,
+                                        max_rss=10000, exit_code=0, oom_killed=False))
+        return runs
+
+
+class FakePool:
+    """Пул из size фейковых контейнеров с тем же checkout(), что у ContainerPool"""
+
+    def __init__(self, size: int, delay: float):
+        self._slots = threading.BoundedSemaphore(size)
+        self._container = FakeContainer(delay)
+
+    @contextlib.contextmanager
+    def checkout(self):
+        with self._slots:
+            yield self._container
+
+
+async def start_judges(mode: str, workers: int, judge_ms: float) -> list[asyncio.Task]:
+    """Проверяющие в этом же процессе; external - проверяющие запущены отдельно"""
+    from src.judge import worker
+    from src.judge.cache import JudgeCache
+
+    if mode == "fake":
+        # отдельный тег: вердикты фейковой песочницы не попадут в кэш настоящей
+        await JudgeCache.set_image_tag("fake-sandbox")
+        # как у workers отдельных процессов: у каждого свой пул контейнеров и потоков
+        aio = sandbox.AsyncSandbox(max_workers=settings.SANDBOX_THREADS * workers)
+        pools = {sandbox.Python.get_dockerfile_path(): FakePool(settings.JUDGE_POOL_SIZE * workers, judge_ms / 1000)}
+        return [asyncio.create_task(worker.run_jobs(pools, aio)) for _ in range(workers)]
+    if mode == "docker":
+        tags = await asyncio.to_thread(worker.prepare_images)
+        return [asyncio.create_task(worker.worker_loop(tags)) for _ in range(workers)]
+    return []
+
+
+class Classroom:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, args):
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.suffix = secrets.token_hex(4)
+        self.email = f"bench-{self.suffix}@example.com"
+        self.headers = {}
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(name, started, error=type(e).__name__)
+            raise
+        self.recorder.record(name, started, error=str(response.status_code) if response.status_code >= 400 else None)
+        return response
+
+    async def login(self):
+        response = await self.call("POST /teachers/login", "POST", "/teachers/login",
+                                   data={"username": self.email, "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def prepare(self) -> tuple[int, str]:
+        """Преподаватель, задание с тестами и сессия; возвращает (task_id, код сессии)"""
+        await self.call("POST /teachers/register", "POST", "/teachers/register",
+                        data={"name": "bench", "email": self.email, "password": PASSWORD})
+        await self.login()
+        title = f"bench-{self.suffix}"
+        await self.call("POST /teachers/create_task", "POST", "/teachers/create_task", headers=self.headers,
+                        data={"title": title, "text": "Выведите сумму двух чисел"})
+        response = await self.call("GET /teachers/teacher_mainpage", "GET", "/teachers/teacher_mainpage",
+                                   headers=self.headers, params={"title": title})
+        task_id = response.json()["tasks"][0]["id"]
+        body = "".join(json.dumps({"input": f"{i} {i * 7}", "output": i * 8}) + "\n" for i in range(self.args.tests))
+        await self.call("POST /teachers/upload_tests/{task_id}", "POST", f"/teachers/upload_tests/{task_id}",
+                        headers=self.headers, params={"format": "jsonl"}, content=body.encode())
+        await self.call("GET /teachers/view_task_info", "GET", "/teachers/view_task_info",
+                        headers=self.headers, params={"task_id": task_id})
+        deadline = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        response = await self.call("POST /teachers/create_session", "POST", "/teachers/create_session",
+                                   headers=self.headers, params={"task_id": task_id},
+                                   data={"deadline_time": deadline.isoformat()})
+        response.raise_for_status()
+        return task_id, response.json()["unique_code"]
+
+    async def join(self, unique_code: str, number: int) -> dict:
+        """Токен участника и id сессии"""
+        response = await self.call("POST /users/join_to_session", "POST", "/users/join_to_session",
+                                   data={"unique_code": unique_code, "name": f"student {number}"})
+        response.raise_for_status()
+        return response.json()
+
+    async def start(self, unique_code: str, session_id: int):
+        # ответ - редирект на страницу начатой сессии, переходить по нему не нужно
+        await self.call("POST /teachers/session_preview/{unique_code}", "POST",
+                        f"/teachers/session_preview/{unique_code}", headers=self.headers,
+                        params={"session_id": session_id})
+
+    async def submit(self, token: str, number: int) -> dict:
+        # разный код у каждого ученика, иначе все посылки кроме первой возьмутся из кэша вердиктов
+        code = SOLUTION if self.args.same_code else f"{SOLUTION}# student {number}\n"
+        started = time.perf_counter()
+        while True:
+            response = await self.call("POST /users/send_code", "POST", "/users/send_code",
+                                       headers={"Authorization": f"Bearer {token}"},
+                                       data={"code": code, "language": self.args.language})
+            if response.status_code != 429:
+                break
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        response.raise_for_status()
+        submission_id = response.json()["submission_id"]
+        while True:
+            response = await self.call("POST /users/view_results", "POST", "/users/view_results",
+                                       params={"submission_id": submission_id})
+            result = response.json() if response.status_code == 200 else {}
+            if result.get("status") in ("done", "failed"):
+                self.recorder.record("judge: send_code -> verdict", started,
+                                     error=None if result["status"] == "done" else "failed")
+                return result
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def review(self, task_id: int, unique_code: str):
+        # токен живет пару минут - к концу большого прогона он мог истечь
+        await self.login()
+        await self.call("POST /teachers/view_session_results/{unique_code}", "POST",
+                        f"/teachers/view_session_results/{unique_code}", headers=self.headers)
+        await self.call("POST /teachers/view_session_results/{unique_code}?format=csv", "POST",
+                        f"/teachers/view_session_results/{unique_code}", headers=self.headers,
+                        params={"format": "csv"})
+        await self.call("GET /teachers/task_analytics", "GET", "/teachers/task_analytics",
+                        headers=self.headers, params={"task_id": task_id})
+
+    async def run(self) -> dict:
+        task_id, unique_code = await self.prepare()
+        numbers = range(self.args.students)
+        started = time.perf_counter()
+        participants = await asyncio.gather(*(self.join(unique_code, number) for number in numbers))
+        joined = time.perf_counter()
+        # ученики подключаются к еще не начатой сессии, решения принимаются после старта
+        await self.start(unique_code, participants[0]["session_id"])
+        # дедлайн: все отправляют одновременно
+        results = await asyncio.gather(*(self.submit(participant["token"], number)
+                                         for participant, number in zip(participants, numbers)))
+        judged = time.perf_counter()
+        await self.review(task_id, unique_code)
+        accepted = sum(result.get("test_passed") == self.args.tests for result in results)
+        return {"join_time": joined - started, "judge_time": judged - joined, "accepted": accepted}
+
+
+@contextlib.asynccontextmanager
+async def make_client(base_url: str | None, students: int):
+    if base_url:
+        limits = httpx.Limits(max_connections=students + 10)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            yield client
+        return
+    from main import app
+    from src.session_codes import load_or_create_key
+    from src.utils import create_tables
+
+    await create_tables()
+    load_or_create_key(settings.SESSION_CODE_KEY_PATH)
+    # lifespan приложения: таблица результатов, дедлайны и сворачивание статистики работают как на сервере
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://classroom", timeout=120) as client:
+            yield client
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--tests", type=int, default=10)
+    parser.add_argument("--language", default="python")
+    parser.add_argument("--same-code", action="store_true", help="одинаковый код у всех (путь через кэш вердиктов)")
+    parser.add_argument("--sandbox", choices=("fake", "docker", "external"), default="fake")
+    parser.add_argument("--judge-workers", type=int, default=settings.JUDGE_WORKERS)
+    parser.add_argument("--judge-ms", type=float, default=2.0, help="время фейковой песочницы на тест, мс")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--base-url", help="адрес запущенного API вместо приложения в этом процессе")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохраненными результатами")
+    parser.add_argument("--threshold", type=float, default=0.20, help="допустимое замедление p95")
+    args = parser.parse_args()
+    if args.sandbox == "fake" and args.language != "python":
+        parser.error("фейковая песочница умеет только python")
+
+    recorder = Recorder()
+    async with make_client(args.base_url, args.students) as client:
+        judges = await start_judges(args.sandbox, args.judge_workers, args.judge_ms)
+        try:
+            summary = await Classroom(client, recorder, args).run()
+        finally:
+            for judge in judges:
+                judge.cancel()
+            await asyncio.gather(*judges, return_exceptions=True)
+
+    results = recorder.results()
+    print_table(results)
+    verdicts = summarize(recorder.samples.get("judge: send_code -> verdict", []), elapsed=summary["judge_time"])
+    print(f"\n{args.students} students, {args.tests} tests, sandbox {args.sandbox}: "
+          f"joined in {summary['join_time']:.2f}s, all judged in {summary['judge_time']:.2f}s "
+          f"({verdicts['throughput']:.1f} submissions/s), accepted {summary['accepted']}/{args.students}")
+    if args.save:
+        save(args.save, "classroom", vars(args), results)
+    if args.baseline and not compare(args.baseline, results, args.threshold, metric="p95"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
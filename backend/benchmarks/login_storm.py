@@ -0,0 +1,59 @@
+"""Одновременный вход N преподавателей: синхронный bcrypt против пула потоков.
+
+Запуск из каталога backend/ (нужны .env и pems, как для самого сервера):
+    python -m benchmarks.login_storm --logins 30
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from src.utils import PasswordActions
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Возвращает максимальную задержку цикла событий за время теста"""
+    max_lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - started - interval)
+    return max_lag
+
+
+async def login_sync(password: str, hashed: str):
+    return PasswordActions.validate(password=password, hashed_password=hashed)
+
+
+async def login_async(password: str, hashed: str):
+    return await PasswordActions.validate_async(password=password, hashed_password=hashed)
+
+
+async def storm(login, logins: int, password: str, hashed: str):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(heartbeat(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await lag_task
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=30)
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    hashed = PasswordActions.hash(password)
+    for name, login in (("sync", login_sync), ("executor", login_async)):
+        elapsed, lag = await storm(login, args.logins, password, hashed)
+        print(f"{name:>8}: {args.logins} logins in {elapsed:.3f}s, "
+              f"{args.logins / elapsed:.1f} logins/s, max event loop lag {lag * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
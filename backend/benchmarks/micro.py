@@ -0,0 +1,128 @@
+"""Микробенчмарки горячих мест: bcrypt, JWT, Users.view_task_info и Python.run_code.
+
+Без флагов меряются только PasswordActions и JWTActions; --db добавляет view_task_info
+(нужна локальная БД, создаются преподаватель и задание), --docker - run_code в контейнере.
+Запуск из каталога backend/:
+    python -m benchmarks.micro --db --docker --save micro.json
+    python -m benchmarks.micro --db --docker --baseline micro.json   # после изменений
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import secrets
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from benchmarks.stats import compare, print_table, save, summarize
+from src.config import settings
+from src.utils import JWTActions, PasswordActions
+
+
+async def measure(func, repeat: int, warmup: int = 1) -> dict:
+    """Вызывает func repeat раз (после warmup прогревочных) и считает перцентили одного вызова.
+
+    func может вернуть корутину - тогда в замер входит и ее выполнение
+    """
+    for _ in range(warmup):
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def auth_benchmarks(rounds: int) -> dict:
+    password = "correct horse battery staple"
+    hashed = PasswordActions.hash(password, rounds=rounds)
+    token = JWTActions.encode({"sub": "bench@example.com"})
+    return {
+        "PasswordActions.hash": lambda: PasswordActions.hash(password, rounds=rounds),
+        "PasswordActions.validate": lambda: PasswordActions.validate(password, hashed),
+        "JWTActions.encode": lambda: JWTActions.encode({"sub": "bench@example.com"}),
+        "JWTActions.decode": lambda: JWTActions.decode(token),
+    }
+
+
+async def db_benchmarks(tests: int) -> dict:
+    from src.db_action.queries import Users
+    from src.schemas.incoming import Tests
+    from src.schemas.router_db import TeacherRegister
+    from src.utils import create_tables
+
+    await create_tables()
+    suffix = secrets.token_hex(4)
+    email = f"bench-{suffix}@example.com"
+    await Users.register_teacher(TeacherRegister(name="bench", email=email, password="bench-password"))
+    teacher = await Users.get_teacher_info_by_email(teacher_email=email)
+    task_id = await Users.create_task_return_task_id(title=f"bench-{suffix}", task_text="a + b", teacher_id=teacher.id)
+    await Users.add_tests_to_task([Tests(input=f"{i} {i}", output=2 * i) for i in range(tests)], task_id=task_id)
+
+    return {
+        f"Users.view_task_info ({tests} tests)": lambda: Users.view_task_info(task_id=task_id),
+        f"Users.view_task_info_json cached ({tests} tests)": lambda: Users.view_task_info_json(task_id=task_id),
+    }
+
+
+def docker_benchmarks():
+    """(бенчмарки, функция уборки): один контейнер Python на все замеры"""
+    from backend.docker_lib_nekit.docker_sandbox import sandbox
+
+    image = sandbox.build(sandbox.Python)
+    container = sandbox.run(image, mem=settings.JUDGE_MEM_LIMIT, nano_cpus=settings.JUDGE_NANO_CPUS)
+    code = "print(sum(range(1000)))"
+    benchmarks = {
+        "Python.run_code": lambda: container.run_code(code),
+        "Python.run_tests (10 inputs)": lambda: container.run_tests("print(sum(map(int, input().split())))",
+                                                                    inputs=["1 2"] * 10),
+    }
+    return benchmarks, lambda: container.container.remove(force=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--bcrypt-rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    parser.add_argument("--db", action="store_true", help="Users.view_task_info на локальной БД")
+    parser.add_argument("--tests", type=int, default=100, help="тестов в задании для --db")
+    parser.add_argument("--docker", action="store_true", help="Python.run_code на локальном docker")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохраненными результатами")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое замедление p50")
+    args = parser.parse_args()
+
+    benchmarks = auth_benchmarks(args.bcrypt_rounds)
+    cleanup = None
+    if args.db:
+        benchmarks.update(await db_benchmarks(args.tests))
+    if args.docker:
+        docker, cleanup = docker_benchmarks()
+        benchmarks.update(docker)
+
+    results = {}
+    try:
+        for name, func in benchmarks.items():
+            # bcrypt специально медленный - для него хватит меньшего числа повторов
+            repeat = max(args.repeat // 10, 3) if name.startswith("PasswordActions") else args.repeat
+            results[name] = {**await measure(func, repeat), "errors": {}}
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    print_table(results)
+    if args.save:
+        save(args.save, "micro", vars(args), results)
+    if args.baseline and not compare(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
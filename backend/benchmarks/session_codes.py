@@ -0,0 +1,51 @@
+"""Скорость выдачи кодов сессий на разной "глубине" счетчика и проверка уникальности.
+
+Sequence из БД заменен счетчиком в памяти, так что меряется только сам аллокатор.
+Запуск из каталога backend/:
+    python -m benchmarks.session_codes --count 200000
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from src.session_codes import CODE_BLOCK, CODE_SPACE, FeistelPermutation, SessionCodeAllocator
+
+
+def make_allocator(start: int) -> SessionCodeAllocator:
+    counter = {"next": start}
+
+    async def reserve_block() -> int:
+        block_start = counter["next"]
+        counter["next"] += CODE_BLOCK
+        return block_start
+
+    return SessionCodeAllocator(FeistelPermutation(key=secrets.token_bytes(32)), reserve_block=reserve_block)
+
+
+async def measure(start: int, count: int) -> tuple[float, set[str]]:
+    allocator = make_allocator(start)
+    codes = set()
+    started = time.perf_counter()
+    for _ in range(count):
+        codes.add(await allocator.allocate())
+    return (time.perf_counter() - started) / count, codes
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for start in (0, 1_000_000, 100_000_000, CODE_SPACE - args.count):
+        per_code, codes = await measure(start, args.count)
+        unique = "all unique" if len(codes) == args.count else f"{args.count - len(codes)} DUPLICATES"
+        print(f"sessions already issued {start:>13,}: {per_code * 1e6:6.2f} us/code, {unique}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
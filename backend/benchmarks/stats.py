@@ -0,0 +1,96 @@
+"""Общее для бенчмарков: перцентили, таблица результатов и сравнение с прошлым запуском.
+
+Результаты сохраняются в JSON (--save), а запуск с --baseline печатает, что стало медленнее
+больше чем на --threshold, и завершается с кодом 1 - так регрессии видно между коммитами
+"""
+import json
+import math
+import subprocess
+import time
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Перцентиль методом ближайшего ранга; samples должны быть отсортированы"""
+    if not samples:
+        return 0.0
+    return samples[max(math.ceil(fraction * len(samples)) - 1, 0)]
+
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict:
+    """p50/p95/p99 в секундах и пропускная способность (операций в секунду)"""
+    samples = sorted(samples)
+    total = elapsed if elapsed is not None else sum(samples)
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / total if total else 0.0,
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "max": samples[-1] if samples else 0.0,
+    }
+
+
+class Recorder:
+    """Задержки по имени операции (эндпоинту) и окно, в котором операции шли"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, dict[str, int]] = {}
+        self.windows: dict[str, list[float]] = {}
+
+    def record(self, name: str, started: float, error: str | None = None):
+        finished = time.perf_counter()
+        self.samples.setdefault(name, []).append(finished - started)
+        window = self.windows.setdefault(name, [started, finished])
+        window[0] = min(window[0], started)
+        window[1] = max(window[1], finished)
+        if error is not None:
+            errors = self.errors.setdefault(name, {})
+            errors[error] = errors.get(error, 0) + 1
+
+    def results(self) -> dict:
+        results = {}
+        for name, samples in self.samples.items():
+            started, finished = self.windows[name]
+            results[name] = {**summarize(samples, elapsed=finished - started), "errors": self.errors.get(name, {})}
+        return results
+
+
+def print_table(results: dict):
+    print(f"{'operation':<48} {'count':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  errors")
+    for name, row in results.items():
+        errors = ", ".join(f"{code}: {count}" for code, count in row.get("errors", {}).items())
+        print(f"{name:<48} {row['count']:>7} {row['throughput']:>9.1f} {row['p50'] * 1000:>9.2f} "
+              f"{row['p95'] * 1000:>9.2f} {row['p99'] * 1000:>9.2f}  {errors}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path: str, benchmark: str, params: dict, results: dict):
+    with open(path, "w") as f:
+        json.dump({"benchmark": benchmark, "revision": git_revision(), "created_at": time.time(),
+                   "params": params, "results": results}, f, indent=2)
+
+
+def compare(path: str, results: dict, threshold: float, metric: str = "p50") -> bool:
+    """Печатает изменение metric относительно сохраненного запуска; False, если есть регрессия"""
+    with open(path) as f:
+        baseline = json.load(f)
+    print(f"\nagainst {path} (revision {baseline.get('revision')}), {metric}:")
+    ok = True
+    for name, row in results.items():
+        before = baseline["results"].get(name, {}).get(metric)
+        if not before:
+            continue
+        change = row[metric] / before - 1
+        regressed = change > threshold
+        ok = ok and not regressed
+        print(f"{name:<48} {before * 1000:>9.3f} -> {row[metric] * 1000:>9.3f} ms  {change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
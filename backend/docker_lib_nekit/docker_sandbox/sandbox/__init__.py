@@ -4,27 +4,73 @@ import docker
 import os
 
 from . import utils
+from .client import configure, get_client
 from .images import IMAGES, Python, Ubuntu, Container
 from .utils_types import Image
+from .pool import ContainerPool
+from .verdicts import Verdict, TestRun
+from .aio import AsyncSandbox
+from .runners import RUNNERS, ArtifactCache, Runner, get_runner, register_runner
 
 
-__all__ = ['build', 'run', 'get_container', 'Image', 'Container', 'Python', 'Ubuntu']
+__all__ = ['build', 'run', 'get_container', 'image_tag', 'remove_stale_images', 'configure', 'get_client', 'Image',
+           'Container', 'Python', 'Ubuntu', 'ContainerPool', 'Verdict', 'TestRun', 'AsyncSandbox',
+           'Runner', 'ArtifactCache', 'RUNNERS', 'get_runner', 'register_runner']
 
 
 lib_path = '/'.join(__file__.split('/')[:-1])
 
+IMAGE_PREFIX = 'di-'
 
-def build(dockerfile: Type[IMAGES], path: str=f'{lib_path}/', suffix_len: int=16) -> Image:
-    tag = f'di-{dockerfile.get_dockerfile_path()}-{utils.generate_random_hex(suffix_len)}'
-    client = docker.from_env()
+
+def image_tag(dockerfile: Type[IMAGES], path: str=f'{lib_path}/', hash_len: int=16) -> str:
+    """Тег образа по хешу dockerfile-а и контекста сборки: di-<dockerfile>:<хеш>"""
+    name = dockerfile.get_dockerfile_path()
+    # остальные dockerfile-ы на сборку не влияют и в хеш не входят
+    patterns = utils.read_dockerignore(path) + ['docker_images/*']
+    digest = utils.context_hash(path, dockerfile=f'docker_images/{name}', patterns=patterns)
+    return f'{IMAGE_PREFIX}{name}:{digest[:hash_len]}'
+
+
+def build(dockerfile: Type[IMAGES], path: str=f'{lib_path}/', hash_len: int=16, force: bool=False) -> Image:
+    """Собирает образ, если образа с таким же содержимым еще нет; иначе возвращает существующий"""
+    tag = image_tag(dockerfile, path=path, hash_len=hash_len)
+    client = get_client()
+    if not force:
+        try:
+            client.images.get(tag)
+            return Image(image=dockerfile, tag=tag, build_logs=iter(()))
+        except docker.errors.ImageNotFound:
+            pass
     image, build_logs = client.images.build(path=path,
                                             dockerfile=f'{lib_path}/docker_images/{dockerfile.get_dockerfile_path()}',
                                             tag=tag)
     return Image(image=dockerfile, tag=tag, build_logs=build_logs)
 
 
+def remove_stale_images(dockerfile: Type[IMAGES], keep_tag: str) -> list[str]:
+    """Удаляет старые теги образа (и старые di-<dockerfile>-<hex> со случайным суффиксом).
+
+    Образы, на которых еще работают контейнеры, docker удалить не даст - они пропускаются
+    """
+    client = get_client()
+    name = dockerfile.get_dockerfile_path()
+    prefixes = (f'{IMAGE_PREFIX}{name}:', f'{IMAGE_PREFIX}{name}-')
+    removed = []
+    for image in client.images.list():
+        for tag in image.tags:
+            if tag == keep_tag or not tag.startswith(prefixes):
+                continue
+            try:
+                client.images.remove(tag)
+            except docker.errors.APIError:
+                continue
+            removed.append(tag)
+    return removed
+
+
 def run(image: Image, start_command='', mem='500M', nano_cpus=10000000) -> IMAGES:
-    client = docker.from_env()
+    client = get_client()
     container = client.containers.run(
         image.tag,
         name=f'sandbox-{utils.generate_random_hex(16)}',
@@ -41,7 +87,7 @@ def run(image: Image, start_command='', mem='500M', nano_cpus=10000000) -> IMAGE
 
 
 def get_container(container_id: str, image: Type[IMAGES]=None) -> IMAGES | Container:
-    client = docker.from_env()
+    client = get_client()
     container = client.containers.get(container_id)
     if image:
         return image(container=container)
@@ -0,0 +1,41 @@
+"""Подготовка образов песочницы заранее, чтобы старт проверяющих не ждал docker build.
+
+    python -m backend.docker_lib_nekit.docker_sandbox.sandbox warmup [python ubuntu] [--force] [--no-gc]
+    python -m backend.docker_lib_nekit.docker_sandbox.sandbox gc [python ubuntu]
+"""
+import argparse
+
+from . import Python, Ubuntu, build, image_tag, remove_stale_images
+
+
+DOCKERFILES = {'python': Python, 'ubuntu': Ubuntu}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='sandbox')
+    parser.add_argument('command', choices=['warmup', 'gc'])
+    parser.add_argument('images', nargs='*', help=f'из {", ".join(DOCKERFILES)}; по умолчанию python')
+    parser.add_argument('--force', action='store_true', help='пересобрать, даже если образ уже есть')
+    parser.add_argument('--no-gc', action='store_true', help='не удалять старые теги после сборки')
+    args = parser.parse_args()
+    unknown = set(args.images) - set(DOCKERFILES)
+    if unknown:
+        parser.error(f'неизвестные образы: {", ".join(sorted(unknown))}')
+
+    for name in args.images or ['python']:
+        dockerfile = DOCKERFILES[name]
+        if args.command == 'warmup':
+            image = build(dockerfile, force=args.force)
+            for _ in image.build_logs:
+                pass
+            print(f'{name}: {image.tag}')
+            tag = image.tag
+        else:
+            tag = image_tag(dockerfile)
+        if args.command == 'gc' or not args.no_gc:
+            for removed in remove_stale_images(dockerfile, keep_tag=tag):
+                print(f'{name}: removed {removed}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import asyncio
+import functools
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Type
+
+from .images import IMAGES, Container, ExecOutput, Python
+from .utils_types import Image
+from .verdicts import TestRun
+
+
+class AsyncSandbox:
+    """asyncio-фасад песочницы: блокирующие вызовы docker SDK уходят в отдельный пул потоков.
+
+    Размер пула ограничивает число одновременных запросов к dockerd; остальные вызовы
+    ждут своей очереди, не блокируя цикл событий. Пул стоит держать не больше
+    max_pool_size общего клиента (client.configure), иначе потоки будут ждать соединений
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sandbox-aio')
+
+    async def call(self, func: Callable, *args, **kwargs):
+        """Выполняет произвольную блокирующую функцию песочницы в пуле"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def run(self, image: Image, **kwargs) -> IMAGES:
+        from . import run
+        return await self.call(run, image, **kwargs)
+
+    async def get_container(self, container_id: str, image: Type[IMAGES] = None) -> IMAGES | Container:
+        from . import get_container
+        return await self.call(get_container, container_id, image)
+
+    async def remove(self, container: Container):
+        await self.call(container.container.remove, force=True)
+
+    async def run_code(self, container: Python, code: str) -> str:
+        return await self.call(container.run_code, code)
+
+    async def exec(self, container: Container, command: list[str], **kwargs) -> ExecOutput:
+        return await self.call(container.exec_stream, command, **kwargs)
+
+    async def logs(self, container: Container) -> str:
+        return await self.call(container.get_logs)
+
+    async def judge(self, container: Python, code: str, tests: list[tuple[str, str | None]], **kwargs) -> list[TestRun]:
+        return await self.call(container.judge, code, tests, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,42 @@
+import os
+import threading
+
+import docker
+
+
+_client: docker.DockerClient | None = None
+_options: dict = {'timeout': 60, 'max_pool_size': 10}
+_lock = threading.Lock()
+
+
+def configure(**options):
+    """Параметры общего клиента (аргументы docker.from_env: timeout, max_pool_size, environment, ...).
+
+    Действуют для следующего get_client(); уже созданный клиент закрывается
+    """
+    global _client
+    with _lock:
+        _options.update(options)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_client() -> docker.DockerClient:
+    """Один долгоживущий клиент на процесс: пул HTTP-соединений к dockerd переиспользуется между вызовами"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = docker.from_env(**_options)
+    return _client
+
+
+def _reset_after_fork():
+    # соединения родителя нельзя делить с дочерним процессом (multiprocessing в judge)
+    global _client, _lock
+    _client = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
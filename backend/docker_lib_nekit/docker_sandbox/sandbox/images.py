@@ -1,5 +1,33 @@
+import json
+import socket
+from collections.abc import Callable
+
 import docker
 from docker.models import containers
+from docker.utils.socket import STDERR, STDOUT, frames_iter
+
+from . import utils
+from .verdicts import TestRun, classify, naive_compare
+
+
+# раннер копируется в образ при сборке (python.dockerfile, ubuntu.dockerfile), в /tmp его не кладем:
+# /tmp чистится между проверками
+RUNNER_PATH = '/opt/judge/runner.py'
+# каталог сборки скомпилированных решений
+BUILD_DIR = '/tmp/build'
+# длина трейлера раннера в конце его stdout (SIZE_DIGITS в scripts/batch_runner.py)
+TRAILER_SIZE_DIGITS = 20
+
+
+class ExecOutput:
+    def __init__(self, stdout: bytes, stderr: bytes, exit_code: int | None, truncated: bool, timed_out: bool):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exit_code = exit_code  # None, если процесс еще не завершился
+        self.truncated = truncated
+        self.timed_out = timed_out
+
+
 class Container:
     def __init__(self, container: containers.Container):
         self.container = container
@@ -23,6 +51,110 @@ class Container:
         exec_command = self.container.exec_run(command, tty=True, stdin=True)
         return exec_command.output.decode()
 
+    def exec_stream(self, command: list[str], stdin: bytes = b'', max_stdout: int = 1 << 20,
+                    max_stderr: int = 65536, timeout: float | None = None, workdir: str | None = None) -> ExecOutput:
+        """Выполняет команду без шелла: stdin передается через сокет exec-а,
+        stdout и stderr читаются раздельно и обрезаются по лимитам.
+
+        Если процесс пишет больше лимита, сокет закрывается и процесс получает EPIPE,
+        так что память проверяющего не растет вместе с выводом решения
+        """
+        api = self.container.client.api
+        exec_id = api.exec_create(self.container.id, command, stdin=True, stdout=True, stderr=True,
+                                  workdir=workdir)['Id']
+        sock = api.exec_start(exec_id, socket=True)
+        raw = getattr(sock, '_sock', sock)
+        raw.settimeout(timeout)
+        stdout, stderr = bytearray(), bytearray()
+        truncated = timed_out = False
+        try:
+            if stdin:
+                raw.sendall(stdin)
+            raw.shutdown(socket.SHUT_WR)
+            for stream, data in frames_iter(sock, tty=False):
+                if stream not in (STDOUT, STDERR):
+                    continue
+                buffer, limit = (stdout, max_stdout) if stream == STDOUT else (stderr, max_stderr)
+                room = limit - len(buffer)
+                buffer += data[:room]
+                if len(data) > room:
+                    truncated = True
+                    break
+        except socket.timeout:
+            timed_out = True
+        except BrokenPipeError:
+            # процесс завершился, не дочитав stdin
+            pass
+        finally:
+            sock.close()
+        exit_code = api.exec_inspect(exec_id).get('ExitCode')
+        return ExecOutput(stdout=bytes(stdout), stderr=bytes(stderr), exit_code=exit_code,
+                          truncated=truncated, timed_out=timed_out)
+
+    def run_batch(self, header: dict, inputs: list[str], timeout: float, max_output: int) -> list[dict]:
+        """Один exec раннера на все входные данные (протокол - в scripts/batch_runner.py).
+
+        Заголовок и входы уходят через stdin, выводы возвращаются сырыми байтами.
+        Возвращает по словарю на каждый вход: output, error, timed_out, time, cpu_time,
+        max_rss (КБ), exit_code, oom_killed, memory_error
+        """
+        marker = f'<<<judge-{utils.generate_random_hex(16)}>>>'
+        encoded = [case_input.encode() for case_input in inputs]
+        header = json.dumps({**header, 'timeout': timeout, 'max_output': max_output, 'marker': marker,
+                             'input_sizes': [len(case_input) for case_input in encoded]})
+
+        # общий таймаут на случай, если завис сам раннер
+        total_timeout = int((timeout + 2) * len(inputs)) + 5
+        # выводы тестов уже обрезаны раннером; сверху - запас на статистику и посторонний вывод
+        result = self.exec_stream(
+            ['timeout', '-s', 'KILL', str(total_timeout), 'python3', RUNNER_PATH],
+            stdin=header.encode() + b'\n' + b''.join(encoded),
+            max_stdout=max_output * len(inputs) + 1024 * (len(inputs) + 64),
+            timeout=total_timeout + 5,
+        )
+        body = split_trailer(result.stdout, marker.encode())
+        if body is None:
+            return self._runner_failed(result, len(inputs))
+        meta, _, outputs = body.partition(b'\n')
+        try:
+            results = json.loads(meta)
+            if len(results) != len(inputs):
+                raise ValueError(f'{len(results)} results for {len(inputs)} inputs')
+            offset = 0
+            for case in results:
+                size = case.pop('output_size')
+                case['output'] = outputs[offset:offset + size].decode(errors='replace')
+                offset += size
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return self._runner_failed(result, len(inputs), error=f'judge runner failed: bad stats trailer ({e})')
+        return results
+
+    def _runner_failed(self, result: ExecOutput, count: int, error: str | None = None) -> list[dict]:
+        """Результат "раннер не отработал" для всех count тестов"""
+        error = error or result.stderr.decode(errors='replace') or 'judge runner failed'
+        timed_out = result.timed_out or result.exit_code in (124, 137)
+        self.container.reload()
+        oom_killed = bool(self.container.attrs['State'].get('OOMKilled'))
+        return [{'output': '', 'error': error, 'timed_out': timed_out, 'time': 0.0, 'cpu_time': 0.0,
+                 'max_rss': 0, 'exit_code': result.exit_code, 'oom_killed': oom_killed,
+                 'memory_error': False, 'runner_failed': True} for _ in range(count)]
+
+
+def split_trailer(stdout: bytes, marker: bytes) -> bytes | None:
+    """Трейлер раннера (статистика и выводы) по длине с конца stdout; None, если его нет.
+
+    Посторонний вывод решения идет раньше трейлера, поэтому marker внутри него
+    не может подменить статистику
+    """
+    size_field = stdout[-TRAILER_SIZE_DIGITS:]
+    if len(size_field) != TRAILER_SIZE_DIGITS or not size_field.isdigit():
+        return None
+    end = len(stdout) - TRAILER_SIZE_DIGITS
+    start = end - int(size_field)
+    if start < len(marker) or stdout[start - len(marker):start] != marker:
+        return None
+    return stdout[start:end]
+
 
 class Python(Container):
     def __init__(self, container):
@@ -33,13 +165,31 @@ class Python(Container):
     def get_dockerfile_path():
         return 'python.dockerfile'
 
-    @staticmethod
-    def code_format(code: str):
-        return f'python -c "{code.replace("\u00A0", " ").replace('\"', r'\"')}"'
+    def run_code(self, code: str) -> str:
+        """Выполняет код, переданный через stdin (python -), и возвращает его вывод"""
+        result = self.exec_stream(['python', '-'], stdin=code.replace('\u00A0', ' ').encode())
+        return (result.stdout + result.stderr).decode(errors='replace')
 
-    def run_code(self, code):
-        exec_command = self.container.exec_run(Python.code_format(code), tty=True, stdin=True)
-        return exec_command.output.decode()
+    def run_tests(self, code: str, inputs: list[str], timeout: float = 2.0, max_output: int = 65536,
+                  memory_limit: int | None = None) -> list[dict]:
+        """Прогоняет код на всех входных данных за один exec, каждый вход - в отдельном процессе.
+
+        max_output - лимит вывода одного теста в байтах;
+        memory_limit - байты сверх памяти интерпретатора, None - без лимита (остается лимит контейнера)
+        """
+        header = {'mode': 'python', 'code': code.replace('\u00A0', ' '), 'memory_limit': memory_limit}
+        return self.run_batch(header, inputs=inputs, timeout=timeout, max_output=max_output)
+
+    def judge(self, code: str, tests: list[tuple[str, str | None]], time_limit: float = 2.0,
+              memory_limit: int = 256, compare: Callable[[str, str], bool] = naive_compare) -> list[TestRun]:
+        """Проверяет решение на тестах (вход, ожидаемый вывод) с лимитами на каждый тест.
+
+        time_limit - секунды (wall-clock и CPU), memory_limit - МБ.
+        Если ожидаемый вывод None, вердикт ставится только по ресурсам и коду выхода
+        """
+        results = self.run_tests(code, inputs=[test_input for test_input, _ in tests], timeout=time_limit,
+                                 memory_limit=memory_limit * 1024 * 1024)
+        return to_test_runs(results, tests, compare)
 
 
 class Ubuntu(Container):
@@ -51,7 +201,37 @@ class Ubuntu(Container):
     def get_dockerfile_path():
         return 'ubuntu.dockerfile'
 
-
+    def compile(self, source: bytes, source_name: str, command: list[str], timeout: int = 30) -> ExecOutput:
+        """Кладет исходник в BUILD_DIR и выполняет там команду компиляции"""
+        self.container.put_archive('/tmp', utils.make_tar({f'build/{source_name}': source}))
+        return self.exec_stream(['timeout', '-s', 'KILL', str(timeout)] + command, workdir=BUILD_DIR,
+                                timeout=timeout + 5)
+
+    def fetch_artifact(self, name: str) -> bytes:
+        """Содержимое собранного файла из BUILD_DIR (для кэша артефактов)"""
+        stream, _ = self.container.get_archive(f'{BUILD_DIR}/{name}')
+        return utils.read_tar_file(b''.join(stream))
+
+    def put_artifact(self, name: str, data: bytes):
+        self.container.put_archive('/tmp', utils.make_tar({f'build/{name}': data}, mode=0o755))
+
+    def run_binary_tests(self, command: list[str], inputs: list[str], timeout: float = 2.0, max_output: int = 65536,
+                         memory_limit: int | None = None) -> list[dict]:
+        """Запускает уже собранную программу из BUILD_DIR на всех входных данных за один exec"""
+        header = {'mode': 'exec', 'command': command, 'cwd': BUILD_DIR, 'memory_limit': memory_limit}
+        return self.run_batch(header, inputs=inputs, timeout=timeout, max_output=max_output)
+
+
+
+def to_test_runs(results: list[dict], tests: list[tuple[str, str | None]],
+                 compare: Callable[[str, str], bool] = naive_compare) -> list[TestRun]:
+    return [
+        TestRun(verdict=classify(result, expected, compare), output=result['output'], error=result['error'],
+                time=result['time'], cpu_time=result['cpu_time'], max_rss=result['max_rss'],
+                exit_code=result['exit_code'], oom_killed=result['oom_killed'],
+                runner_failed=result.get('runner_failed', False))
+        for (_, expected), result in zip(tests, results)
+    ]
 
 
 IMAGES = Python | Ubuntu
\ No newline at end of file
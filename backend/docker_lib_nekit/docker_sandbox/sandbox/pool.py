@@ -0,0 +1,265 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from .images import IMAGES
+from .utils_types import Image
+
+
+# Убивает все процессы кроме PID 1 (и самого sh) и чистит временные файлы,
+# чтобы следующий пользователь получил "чистый" контейнер
+RESET_COMMAND = ['sh', '-c', 'kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; exit 0']
+
+
+class PoolStats:
+    """Счетчики пула; их меняют потоки проверки и поток пополнения одновременно"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.recycled = 0
+        self.reset_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_checkout(self, hit: bool, wait: float):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def incr(self, name: str):
+        """+1 к счетчику created, recycled или reset_failures"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return self._as_dict()
+
+    def _as_dict(self) -> dict:
+        checkouts = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / checkouts if checkouts else 0.0,
+            'created': self.created,
+            'recycled': self.recycled,
+            'reset_failures': self.reset_failures,
+            'checkout_wait_avg': self.wait_total / checkouts if checkouts else 0.0,
+            'checkout_wait_max': self.wait_max,
+        }
+
+
+class _PoolEntry:
+    def __init__(self, container: IMAGES):
+        self.container = container
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+
+class ContainerPool:
+    """Пул заранее запущенных контейнеров одного образа.
+
+    Контейнер выдается на одну проверку, после чего сбрасывается и возвращается
+    в пул, либо пересоздается, если превысил max_uses / max_age.
+    Фон держит size запущенных контейнеров; при нехватке acquire запускает еще до
+    max_overflow сверх них, а затем ждет освободившийся. Лишние сверх size при возврате
+    удаляются, если их никто не ждет, так что после всплеска пул сжимается обратно до size
+    """
+
+    def __init__(self, image: Image, size: int = 4, mem: str = '500M', nano_cpus: int = 10000000,
+                 max_uses: int = 50, max_age: float = 600.0, refill_interval: float = 1.0, max_overflow: int = 0):
+        self.image = image
+        self.size = size
+        self.max_overflow = max_overflow
+        self.mem = mem
+        self.nano_cpus = nano_cpus
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+
+        self._idle: queue.Queue[_PoolEntry] = queue.Queue()
+        self._entries: dict[str, _PoolEntry] = {}
+        self._lock = threading.Lock()
+        # все контейнеры пула, включая запускаемые прямо сейчас, и число ждущих в acquire (под _lock)
+        self._total = 0
+        self._waiting = 0
+        self._stats = PoolStats()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._refiller: threading.Thread | None = None
+
+    def start(self, wait: bool = True):
+        """Запускает фоновое пополнение пула; при wait=True ждет первого заполнения"""
+        if wait:
+            self._refill()
+        self._refiller = threading.Thread(target=self._refill_loop, name='sandbox-pool-refill', daemon=True)
+        self._refiller.start()
+
+    def acquire(self, timeout: float | None = None) -> IMAGES:
+        """Выдает контейнер из пула. Если свободных нет, запускает новый в пределах size + max_overflow,
+        иначе ждет освободившийся до timeout (None - без ограничения) и бросает TimeoutError
+        """
+        started = time.monotonic()
+        hit = True
+        while True:
+            entry = self._take_idle()
+            if entry is not None:
+                break
+            hit = False
+            if self._reserve(self.size + self.max_overflow):
+                entry = self._spawn_reserved()
+                break
+            entry = self._wait_idle(started, timeout)
+            if not self._expired(entry):
+                break
+            self._discard(entry)
+        self._stats.record_checkout(hit=hit, wait=time.monotonic() - started)
+        return entry.container
+
+    def release(self, container: IMAGES):
+        """Возвращает контейнер в пул или удаляет его по политике вытеснения"""
+        entry = self._entries.get(container.container.id)
+        if entry is None:
+            self._discard_container(container)
+            return
+        entry.uses += 1
+        if self._expired(entry) or not self._reset(entry) or self._over_size():
+            self._discard(entry)
+            self._wakeup.set()
+            return
+        self._idle.put(entry)
+
+    @contextmanager
+    def checkout(self, timeout: float | None = None):
+        container = self.acquire(timeout=timeout)
+        try:
+            yield container
+        finally:
+            self.release(container)
+
+    def stats(self) -> dict:
+        data = self._stats.as_dict()
+        data.update(size=self.size, max_overflow=self.max_overflow, idle=self._idle.qsize(), total=self._total)
+        return data
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._refiller is not None:
+            self._refiller.join()
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            self._discard(entry, count=False)
+
+    def _wait_idle(self, started: float, timeout: float | None) -> _PoolEntry:
+        """Ждет возвращенный контейнер; понемногу, чтобы заметить слот, освободившийся удалением"""
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait = self.refill_interval
+                if timeout is not None:
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f'нет свободного контейнера за {timeout} с')
+                    wait = min(wait, remaining)
+                try:
+                    return self._idle.get(timeout=wait)
+                except queue.Empty:
+                    if self._reserve(self.size + self.max_overflow):
+                        return self._spawn_reserved()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _reserve(self, limit: int) -> bool:
+        """Занимает место под новый контейнер, если всего их меньше limit"""
+        with self._lock:
+            if self._total >= limit:
+                return False
+            self._total += 1
+            return True
+
+    def _over_size(self) -> bool:
+        """Контейнер сверх size, который никто не ждет, - его не нужно возвращать в пул"""
+        with self._lock:
+            return self._total > self.size and self._waiting == 0
+
+    def _take_idle(self) -> _PoolEntry | None:
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if not self._expired(entry):
+                return entry
+            self._discard(entry)
+
+    def _expired(self, entry: _PoolEntry) -> bool:
+        return entry.uses >= self.max_uses or time.monotonic() - entry.created_at >= self.max_age
+
+    def _reset(self, entry: _PoolEntry) -> bool:
+        try:
+            result = entry.container.container.exec_run(RESET_COMMAND)
+        except Exception:
+            self._stats.incr('reset_failures')
+            return False
+        if result.exit_code != 0:
+            self._stats.incr('reset_failures')
+            return False
+        return True
+
+    def _spawn_reserved(self) -> _PoolEntry:
+        """Запускает контейнер на место, занятое _reserve; при ошибке место освобождается"""
+        # импорт здесь, т.к. run определен в __init__ пакета, который импортирует этот модуль
+        from . import run
+        try:
+            container = run(self.image, mem=self.mem, nano_cpus=self.nano_cpus)
+        except BaseException:
+            with self._lock:
+                self._total -= 1
+            raise
+        entry = _PoolEntry(container)
+        with self._lock:
+            self._entries[container.container.id] = entry
+        self._stats.incr('created')
+        return entry
+
+    def _discard(self, entry: _PoolEntry, count: bool = True):
+        with self._lock:
+            if self._entries.pop(entry.container.container.id, None) is not None:
+                self._total -= 1
+        if count:
+            self._stats.incr('recycled')
+        self._discard_container(entry.container)
+
+    @staticmethod
+    def _discard_container(container: IMAGES):
+        try:
+            container.container.remove(force=True)
+        except Exception:
+            pass
+
+    def _refill(self):
+        while not self._stopped.is_set() and self._reserve(self.size):
+            try:
+                entry = self._spawn_reserved()
+            except Exception:
+                # демон docker недоступен - попробуем на следующей итерации
+                return
+            self._idle.put(entry)
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            self._refill()
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
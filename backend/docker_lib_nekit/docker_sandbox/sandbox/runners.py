@@ -0,0 +1,141 @@
+import abc
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Type
+
+from .images import IMAGES, Python, Ubuntu, to_test_runs
+from .verdicts import TestRun, Verdict, naive_compare
+
+
+class ArtifactCache:
+    """Собранные программы в памяти процесса: хеш исходника -> бинарник, LRU по суммарному размеру"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
+
+
+class Runner(abc.ABC):
+    """Язык проверки: в каком образе запускается и как проверяется решение"""
+
+    def __init__(self, language: str, image: Type[IMAGES]):
+        self.language = language
+        self.image = image
+
+    @abc.abstractmethod
+    def judge(self, container: IMAGES, source: str, tests: list[tuple[str, str | None]], time_limit: float = 2.0,
+              memory_limit: int = 256, compare: Callable[[str, str], bool] = naive_compare) -> list[TestRun]:
+        """Прогоняет решение на тестах (вход, ожидаемый вывод) в выданном контейнере"""
+
+
+class PythonRunner(Runner):
+    """Интерпретируемый код: раннер компилирует его в байткод один раз на все тесты"""
+
+    def judge(self, container: Python, source: str, tests: list[tuple[str, str | None]], time_limit: float = 2.0,
+              memory_limit: int = 256, compare: Callable[[str, str], bool] = naive_compare) -> list[TestRun]:
+        return container.judge(source, tests, time_limit=time_limit, memory_limit=memory_limit, compare=compare)
+
+
+class CompiledRunner(Runner):
+    """Компилируемый язык: исходник собирается один раз, затем бинарник гоняется на всех тестах.
+
+    Бинарник забирается из контейнера сразу после сборки (до запуска кода решения)
+    и кэшируется по хешу исходника, команды сборки и образа - повторная
+    посылка того же кода в любой контейнер пула не компилируется заново
+    """
+
+    def __init__(self, language: str, image: Type[Ubuntu], source_name: str, compile_command: list[str],
+                 binary: str = 'main', compile_timeout: int = 30, artifacts: ArtifactCache | None = None):
+        super().__init__(language, image)
+        self.source_name = source_name
+        self.compile_command = compile_command
+        self.binary = binary
+        self.compile_timeout = compile_timeout
+        self.artifacts = artifacts if artifacts is not None else ArtifactCache()
+
+    def artifact_key(self, container: Ubuntu, source: bytes) -> str:
+        digest = hashlib.sha256()
+        for part in (self.language.encode(), '\0'.join(self.compile_command).encode(),
+                     container.container.attrs['Image'].encode(), source):
+            digest.update(part)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def prepare(self, container: Ubuntu, source: bytes) -> tuple[str | None, bool]:
+        """Готовит бинарник в контейнере; возвращает (текст ошибки компиляции или None, компилятор убит по таймауту)"""
+        key = self.artifact_key(container, source)
+        binary = self.artifacts.get(key)
+        if binary is not None:
+            container.put_artifact(self.binary, binary)
+            return None, False
+        result = container.compile(source, self.source_name, self.compile_command, timeout=self.compile_timeout)
+        if result.exit_code != 0:
+            log = (result.stderr + result.stdout).decode(errors='replace')
+            # 137 - компилятор убит timeout -s KILL: это сбой проверки, а не ошибка в решении
+            killed = result.timed_out or result.exit_code == 137
+            return log or f'компиляция завершилась с кодом {result.exit_code}', killed
+        self.artifacts.set(key, container.fetch_artifact(self.binary))
+        return None, False
+
+    def judge(self, container: Ubuntu, source: str, tests: list[tuple[str, str | None]], time_limit: float = 2.0,
+              memory_limit: int = 256, compare: Callable[[str, str], bool] = naive_compare) -> list[TestRun]:
+        error, killed = self.prepare(container, source.replace('\u00A0', ' ').encode())
+        if error is not None:
+            return [TestRun(verdict=Verdict.CE, output='', error=error, time=0.0, cpu_time=0.0, max_rss=0,
+                            exit_code=1, oom_killed=False, runner_failed=killed) for _ in tests]
+        results = container.run_binary_tests([f'./{self.binary}'], inputs=[test_input for test_input, _ in tests],
+                                              timeout=time_limit, memory_limit=memory_limit * 1024 * 1024)
+        return to_test_runs(results, tests, compare)
+
+
+RUNNERS: dict[str, Runner] = {}
+
+
+def register_runner(runner: Runner):
+    """Новый язык - это новый Runner в реестре, без правок в images.py"""
+    RUNNERS[runner.language] = runner
+
+
+def get_runner(language: str) -> Runner:
+    try:
+        return RUNNERS[language]
+    except KeyError:
+        raise ValueError(f'неизвестный язык: {language}')
+
+
+register_runner(PythonRunner('python', Python))
+register_runner(CompiledRunner('c', Ubuntu, 'main.c', ['gcc', '-O2', '-std=c11', '-o', 'main', 'main.c', '-lm']))
+register_runner(CompiledRunner('cpp', Ubuntu, 'main.cpp', ['g++', '-O2', '-std=c++17', '-o', 'main', 'main.cpp']))
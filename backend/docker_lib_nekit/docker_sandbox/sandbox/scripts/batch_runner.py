@@ -0,0 +1,290 @@
+# Запускается ВНУТРИ контейнера (python:3.9-slim), поэтому без синтаксиса новее 3.9.
+# Компилирует код один раз и прогоняет его на всех входных данных: каждый тест -
+# в отдельном fork-процессе с лимитами, чтобы мерить его CPU и память через wait4.
+#
+# Режимы (поле mode заголовка): python - код выполняется в этом же интерпретаторе,
+# exec - запускается уже скомпилированная программа command в каталоге cwd.
+#
+# Протокол (stdin/stdout exec-а, без временных файлов):
+#   stdin:  строка JSON-заголовка (mode, code или command/cwd, timeout, memory_limit, max_output,
+#           marker, input_sizes), затем входные данные тестов подряд, сырыми байтами
+#   stdout: marker, строка JSON со статистикой тестов (output_size вместо output),
+#           затем выводы тестов подряд, сырыми байтами, и в самом конце - длина всего этого
+#           после marker-а, SIZE_DIGITS цифр. Решение может писать в stdout напрямую и подделать
+#           marker, но его вывод всегда идет раньше, поэтому трейлер разбирается с конца по длине
+import io
+import json
+import math
+import os
+import resource
+import selectors
+import signal
+import sys
+import time
+import traceback
+
+
+# счетчик OOM-kill в cgroup контейнера: v2, затем v1
+OOM_EVENT_FILES = ('/sys/fs/cgroup/memory.events', '/sys/fs/cgroup/memory/memory.oom_control')
+# запас по wall-clock сверх лимита: после него родитель убивает процесс теста сам
+WALL_GRACE = 0.5
+MAX_STDERR = 65536
+SIZE_DIGITS = 20
+
+
+class CaseTimeout(BaseException):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def read_oom_kills():
+    for path in OOM_EVENT_FILES:
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, value = line.partition(' ')
+                    if name == 'oom_kill':
+                        return int(value)
+        except OSError:
+            continue
+    return None
+
+
+def virtual_memory_size():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[0]) * resource.getpagesize()
+
+
+def run_child(code, case_input, timeout, memory_limit, max_output, write_fd):
+    """Тело fork-процесса теста: результат уходит родителю через pipe, код выхода - через _exit"""
+    if memory_limit:
+        # лимит на прирост адресного пространства поверх уже загруженного интерпретатора
+        limit = virtual_memory_size() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    cpu_limit = int(math.ceil(timeout)) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+
+    stdout = io.StringIO()
+    error = None
+    timed_out = False
+    memory_error = False
+    exit_code = 0
+    sys.stdin = io.StringIO(case_input.decode(errors='replace'))
+    sys.stdout = stdout
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        exec(code, {'__name__': '__main__', '__builtins__': __builtins__})
+    except CaseTimeout:
+        timed_out = True
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            exit_code = 1
+    except BaseException:
+        # отбрасываем кадр самого раннера, оставляя только трейсбек решения
+        etype, value, tb = sys.exc_info()
+        error = ''.join(traceback.format_exception(etype, value, tb.tb_next))
+        memory_error = isinstance(value, MemoryError)
+        exit_code = 1
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    try:
+        output = stdout.getvalue().encode(errors='replace')[:max_output]
+        meta = json.dumps({'error': error, 'timed_out': timed_out, 'memory_error': memory_error})
+    except MemoryError:
+        output = b''
+        meta = json.dumps({'error': 'MemoryError', 'timed_out': False, 'memory_error': True})
+        exit_code = 1
+    with os.fdopen(write_fd, 'wb') as pipe:
+        pipe.write(meta.encode() + b'\n' + output)
+    os._exit(exit_code & 0xFF)
+
+
+def arm_kill_timer(pid, wall_limit):
+    """Убивает группу процессов теста по истечении wall_limit; возвращает флаг-список срабатывания"""
+    killed = []
+
+    def kill_child(signum, frame):
+        killed.append(True)
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    signal.signal(signal.SIGALRM, kill_child)
+    signal.setitimer(signal.ITIMER_REAL, wall_limit)
+    return killed
+
+
+def collect_child(pid, started, oom_before, killed, timeout):
+    """Ждет процесс теста и собирает его ресурсы через wait4"""
+    _, status, usage = os.wait4(pid, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    wall_time = time.perf_counter() - started
+    oom_after = read_oom_kills()
+    if os.WIFSIGNALED(status):
+        exit_code = -os.WTERMSIG(status)
+    else:
+        exit_code = os.WEXITSTATUS(status)
+    cpu_time = usage.ru_utime + usage.ru_stime
+    return {
+        # SIGKILL по таймеру родителя и SIGXCPU по RLIMIT_CPU - это тоже превышение времени
+        'timed_out': bool(killed) or exit_code == -signal.SIGXCPU or cpu_time > timeout,
+        'time': wall_time,
+        'cpu_time': cpu_time,
+        'max_rss': usage.ru_maxrss,  # КБ
+        'exit_code': exit_code,
+        'oom_killed': oom_before is not None and oom_after is not None and oom_after > oom_before,
+    }
+
+
+def run_case(code, case_input, timeout, memory_limit, max_output):
+    read_fd, write_fd = os.pipe()
+    oom_before = read_oom_kills()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            os.setpgid(0, 0)
+            run_child(code, case_input, timeout, memory_limit, max_output, write_fd)
+        finally:
+            os._exit(1)
+    os.close(write_fd)
+
+    # страховка от зависания в C-коде, где исключение таймаута не срабатывает
+    killed = arm_kill_timer(pid, timeout + WALL_GRACE)
+    with os.fdopen(read_fd, 'rb') as pipe:
+        data = pipe.read()
+    stats = collect_child(pid, started, oom_before, killed, timeout)
+
+    meta, _, output = data.partition(b'\n')
+    try:
+        result = json.loads(meta)
+    except ValueError:
+        result = {'error': None, 'timed_out': False, 'memory_error': False}
+        output = b''
+    stats['timed_out'] = stats['timed_out'] or result['timed_out']
+    if result['error'] is None and stats['exit_code'] < 0 and not stats['timed_out']:
+        result['error'] = 'Процесс завершен сигналом {}'.format(-stats['exit_code'])
+    stats.update(error=result['error'], memory_error=result['memory_error'])
+    return output, stats
+
+
+def exec_child(command, cwd, case_input, timeout, stdout_fd, stderr_fd):
+    """Тело fork-процесса теста скомпилированного решения: лимит CPU, stdin из memfd, затем execv.
+
+    RLIMIT_AS здесь не ставится: неудачный malloc выглядел бы как RE. Память нативного
+    решения ограничивает cgroup контейнера (OOM-kill -> MLE), превышение лимита теста
+    определяется по пиковому RSS
+    """
+    cpu_limit = int(math.ceil(timeout)) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    stdin_fd = os.memfd_create('stdin')
+    with os.fdopen(stdin_fd, 'wb', closefd=False) as f:
+        f.write(case_input)
+    os.lseek(stdin_fd, 0, os.SEEK_SET)
+    os.dup2(stdin_fd, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.chdir(cwd)
+    os.execv(command[0], command)
+
+
+def read_capped(fds, limits, deadline):
+    """Читает pipe-ы до EOF, сохраняя не больше limits байт из каждого; остальное выбрасывается"""
+    buffers = {fd: bytearray() for fd in fds}
+    caps = dict(zip(fds, limits))
+    selector = selectors.DefaultSelector()
+    for fd in fds:
+        selector.register(fd, selectors.EVENT_READ)
+    open_fds = set(fds)
+    while open_fds:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            # pipe держит открытым процесс вне группы теста - дальше не ждем
+            break
+        for key, _ in selector.select(remaining):
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                selector.unregister(key.fd)
+                open_fds.discard(key.fd)
+                continue
+            buffer = buffers[key.fd]
+            buffer += chunk[:caps[key.fd] - len(buffer)]
+    selector.close()
+    for fd in fds:
+        os.close(fd)
+    return [bytes(buffers[fd]) for fd in fds]
+
+
+def run_exec_case(command, cwd, case_input, timeout, memory_limit, max_output):
+    out_read, out_write = os.pipe()
+    err_read, err_write = os.pipe()
+    oom_before = read_oom_kills()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_read)
+        os.close(err_read)
+        try:
+            os.setpgid(0, 0)
+            exec_child(command, cwd, case_input, timeout, out_write, err_write)
+        finally:
+            os._exit(127)
+    os.close(out_write)
+    os.close(err_write)
+
+    # у нативного кода своего таймера нет - убиваем ровно по лимиту
+    killed = arm_kill_timer(pid, timeout)
+    output, stderr = read_capped([out_read, err_read], [max_output, MAX_STDERR],
+                                 deadline=started + timeout + WALL_GRACE + 1)
+    stats = collect_child(pid, started, oom_before, killed, timeout)
+    error = None
+    if not stats['timed_out'] and stats['exit_code'] != 0:
+        error = stderr.decode(errors='replace')
+        if stats['exit_code'] < 0:
+            error += 'Процесс завершен сигналом {}'.format(-stats['exit_code'])
+    stats.update(error=error, memory_error=bool(memory_limit) and stats['max_rss'] * 1024 > memory_limit)
+    return output, stats
+
+
+def failed_case(error):
+    return b'', {'error': error, 'timed_out': False, 'time': 0.0, 'cpu_time': 0.0,
+                 'max_rss': 0, 'exit_code': 1, 'oom_killed': False, 'memory_error': False}
+
+
+def main():
+    stdin = sys.stdin.buffer
+    payload = json.loads(stdin.readline())
+    inputs = [stdin.read(size) for size in payload['input_sizes']]
+
+    timeout, memory_limit, max_output = payload['timeout'], payload.get('memory_limit'), payload['max_output']
+    if payload.get('mode', 'python') == 'exec':
+        cases = [run_exec_case(payload['command'], payload['cwd'], case_input, timeout, memory_limit, max_output)
+                 for case_input in inputs]
+    else:
+        try:
+            code = compile(payload['code'], '<submission>', 'exec')
+        except SyntaxError:
+            error = traceback.format_exc(limit=0)
+            cases = [failed_case(error) for _ in inputs]
+        else:
+            cases = [run_case(code, case_input, timeout, memory_limit, max_output) for case_input in inputs]
+
+    results = []
+    for output, result in cases:
+        result['output_size'] = len(output)
+        results.append(result)
+    body = json.dumps(results).encode() + b'\n' + b''.join(output for output, _ in cases)
+    out = sys.__stdout__.buffer
+    out.write(b'\n' + payload['marker'].encode() + body + str(len(body)).zfill(SIZE_DIGITS).encode())
+    out.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,50 @@
+import hashlib
+import io
 import os
+import tarfile
+
+from docker.utils.build import exclude_paths
 
 def generate_random_hex(length):
     num_bytes = (length + 1) // 2
     random_bytes = os.urandom(num_bytes)
     return random_bytes.hex()[:length]
+
+
+def make_tar(files: dict[str, bytes], mode: int = 0o644) -> bytes:
+    """Собирает tar-архив в памяти для container.put_archive"""
+    stream = io.BytesIO()
+    with tarfile.open(fileobj=stream, mode='w') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+    return stream.getvalue()
+
+
+def read_tar_file(archive: bytes) -> bytes:
+    """Содержимое единственного файла из tar-архива container.get_archive"""
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        member = next(member for member in tar.getmembers() if member.isfile())
+        return tar.extractfile(member).read()
+
+
+def read_dockerignore(root: str) -> list[str]:
+    path = os.path.join(root, '.dockerignore')
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.strip() for line in f.read().splitlines() if line.strip() and not line.startswith('#')]
+
+
+def context_hash(root: str, dockerfile: str, patterns: list[str]) -> str:
+    """sha256 по тем же файлам, что docker SDK отправит в контекст сборки (с учетом .dockerignore)"""
+    digest = hashlib.sha256()
+    for name in sorted(exclude_paths(root, list(patterns), dockerfile=dockerfile)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            continue
+        with open(path, 'rb') as f:
+            digest.update(name.encode() + b'\0' + hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
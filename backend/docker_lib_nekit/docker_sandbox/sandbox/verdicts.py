@@ -0,0 +1,61 @@
+import enum
+from collections.abc import Callable
+
+
+class Verdict(str, enum.Enum):
+    OK = 'OK'    # ответ верный
+    WA = 'WA'    # неверный ответ
+    TLE = 'TLE'  # превышен лимит времени
+    MLE = 'MLE'  # превышен лимит памяти
+    RE = 'RE'    # ошибка выполнения или ненулевой код выхода
+    CE = 'CE'    # ошибка компиляции
+
+
+def naive_compare(output: str, expected: str) -> bool:
+    return output.strip() == expected.strip()
+
+
+class TestRun:
+    """Результат одного теста: вывод, вердикт и потребленные ресурсы"""
+
+    def __init__(self, verdict: Verdict, output: str, error: str | None, time: float, cpu_time: float,
+                 max_rss: int, exit_code: int, oom_killed: bool, runner_failed: bool = False):
+        self.verdict = verdict
+        self.output = output
+        self.error = error
+        self.time = time
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss  # КБ, пиковый RSS процесса теста
+        self.exit_code = exit_code
+        self.oom_killed = oom_killed
+        # сбой самой песочницы (раннер не отработал), а не результат решения - повторный запуск может дать другой
+        self.runner_failed = runner_failed
+
+    def as_dict(self) -> dict:
+        return {
+            'verdict': self.verdict.value,
+            'output': self.output,
+            'error': self.error,
+            'time': self.time,
+            'cpu_time': self.cpu_time,
+            'max_rss': self.max_rss,
+            'exit_code': self.exit_code,
+            'oom_killed': self.oom_killed,
+            'runner_failed': self.runner_failed,
+        }
+
+
+def classify(result: dict, expected: str | None, compare: Callable[[str, str], bool] = naive_compare) -> Verdict:
+    """Вердикт по сырому результату раннера; ресурсы проверяются раньше ответа.
+
+    expected=None - проверять только ресурсы и код выхода (сравнение выполнит вызывающий)
+    """
+    if result.get('oom_killed') or result.get('memory_error'):
+        return Verdict.MLE
+    if result['timed_out']:
+        return Verdict.TLE
+    if result['error'] is not None or result.get('exit_code', 0) != 0:
+        return Verdict.RE
+    if expected is not None and not compare(result['output'], expected):
+        return Verdict.WA
+    return Verdict.OK
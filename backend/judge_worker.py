@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from src.judge.worker import main
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,59 @@
 import os
 import sys
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import uvicorn
 
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
-from backend.src.utils import create_tables
-from src.routers.teacher import teacher_router
-from src.routers.user import user_router
-
-
-
-app = FastAPI()
+from src.utils import create_tables
+from src.config import settings
+from src.session_codes import load_or_create_key
+from src.routers.teacher import teacher_router, teacher_ws_router
+from src.routers.user import user_router, user_ws_router
+from src.routers.service import service_router
+from src.routers.metrics import metrics_router
+from src.metrics import MetricsMiddleware, publish_loop
+from src.leaderboard import leaderboard_hub
+from src.scheduler import deadline_scheduler
+from src.task_stats import stats_compactor
+from src.invalidation import cache_invalidator
+from src.warmup import warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # uvicorn начинает принимать запросы только после этого шага
+    await warmup()
+    background_tasks = [
+        asyncio.create_task(cache_invalidator.run()),
+        asyncio.create_task(publish_loop("api")),
+        asyncio.create_task(leaderboard_hub.run()),
+        asyncio.create_task(deadline_scheduler.run()),
+        asyncio.create_task(stats_compactor.run()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(teacher_router)
 app.include_router(user_router)
+app.include_router(teacher_ws_router)
+app.include_router(user_ws_router)
+app.include_router(service_router)
+app.include_router(metrics_router)
 
 
 
 if __name__ == '__main__':
     async def main():
         await create_tables()
+        load_or_create_key(settings.SESSION_CODE_KEY_PATH)
         config = uvicorn.Config(app, host="127.0.0.1", port=8000)
         server = uvicorn.Server(config)
         await server.serve()
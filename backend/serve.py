@@ -0,0 +1,57 @@
+"""Продакшн-запуск API: несколько процессов uvicorn на всех ядрах.
+
+Таблицы и ключ кодов сессий готовятся один раз здесь, до старта процессов, а не в каждом из них.
+Каждый процесс прогревает соединения в lifespan (src.warmup) и только потом принимает запросы;
+кэши в памяти процессов согласуются через Redis (src.invalidation).
+
+    python serve.py --workers 8
+Пул БД (DB_POOL_SIZE + DB_MAX_OVERFLOW) - на каждый процесс: их сумма должна влезать в max_connections Postgres.
+Проверяющие запускаются отдельно: python judge_worker.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import uvicorn
+
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from src.config import settings
+from src.session_codes import load_or_create_key
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def create_tables_once():
+    from src.database import async_engine
+    from src.utils import create_tables
+    await create_tables()
+    # соединения мастера процессам не нужны
+    await async_engine.dispose()
+
+
+def prepare(create_tables: bool):
+    """Однократная подготовка перед запуском процессов"""
+    if create_tables:
+        asyncio.run(create_tables_once())
+    # иначе процессы при первом старте создавали бы ключ наперегонки
+    load_or_create_key(settings.SESSION_CODE_KEY_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--workers", type=int, default=settings.API_WORKERS or os.cpu_count())
+    parser.add_argument("--no-create-tables", action="store_true", help="схема уже создана")
+    args = parser.parse_args()
+
+    prepare(create_tables=not args.no_create_tables)
+    uvicorn.run("main:app", app_dir=BACKEND_DIR, host=args.host, port=args.port, workers=args.workers,
+                proxy_headers=True, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
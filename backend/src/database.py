@@ -1,20 +1,127 @@
 import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import Annotated
 
-from sqlalchemy import String
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import String, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.config import settings
+from src.metrics import DB_POOL_WAIT
+
+
+slow_query_logger = logging.getLogger("src.database.slow_query")
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет, сколько запрос ждал свободное соединение"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - started
+            pool_wait_stats.record(wait)
+            DB_POOL_WAIT.observe(wait)
 
 
 async_engine = create_async_engine(
-    url=settings.DATABASE_URL_asyncpg,
-    echo=True,
+    # размер кэша подготовленных выражений asyncpg на соединение
+    url=make_url(settings.DATABASE_URL_asyncpg).update_query_dict(
+        {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}),
+    echo=settings.DB_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
 )
 
 async_session_factory = async_sessionmaker(async_engine)
 
+
+if settings.DB_SLOW_QUERY_MS:
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+            slow_query_logger.warning("slow query %.1f ms: %s", elapsed_ms, statement)
+
+
+def pool_stats() -> dict:
+    pool = async_engine.pool
+    checkouts = pool_wait_stats.checkouts
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "checkout_wait_avg": pool_wait_stats.wait_total / checkouts if checkouts else 0.0,
+        "checkout_wait_max": pool_wait_stats.wait_max,
+    }
+
+
+# Сессия текущего HTTP-запроса: все вызовы Users.* внутри одного запроса идут через нее
+request_session: ContextVar[AsyncSession | None] = ContextVar("request_session", default=None)
+
+
+async def get_session():
+    """FastAPI-зависимость: одна сессия на запрос"""
+    async with async_session_factory() as session:
+        request_session.set(session)
+        try:
+            yield session
+        finally:
+            request_session.set(None)
+
+
+@asynccontextmanager
+async def use_session():
+    """Сессия запроса, если она есть, иначе новая (фоновые задачи, воркеры).
+
+    После каждого вызова транзакция сессии запроса закрывается: соединение сразу
+    возвращается в пул, а ошибка одного вызова не ломает следующие вызовы в том же запросе
+    """
+    session = request_session.get()
+    if session is None:
+        async with async_session_factory() as session:
+            yield session
+        return
+    try:
+        yield session
+    finally:
+        # записи методы фиксируют сами; незафиксированное отбрасывается, как при закрытии отдельной сессии
+        if session.in_transaction():
+            await session.rollback()
+
 str_256 = Annotated[str, 256]
 
 class Base(DeclarativeBase):
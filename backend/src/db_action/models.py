@@ -1,10 +1,11 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, text, ForeignKey, JSON
+from sqlalchemy import String, text, ForeignKey, JSON, Index, Sequence
 from typing import Annotated, List, Dict
 import datetime 
 import enum
 
 from src.database import Base
+from src.session_codes import CODE_BLOCK
 
 
 idpk = Annotated[int, mapped_column(primary_key=True)]
@@ -44,6 +45,9 @@ class TaskOrm(Base):
     task_text: Mapped[reqstr] = mapped_column(String(500))
     time_created: Mapped[created_at]
     teacher_fk: Mapped[int] = mapped_column(ForeignKey("teachers.id"))
+    # лимиты на один тест; NULL - значения по умолчанию из настроек
+    time_limit: Mapped[float | None]
+    memory_limit: Mapped[int | None]  # МБ
 
     teacher: Mapped["TeachersOrm"] = relationship(back_populates="tasks")
 
@@ -51,6 +55,13 @@ class TaskOrm(Base):
     comments: Mapped[List["CommentsOrm"]] = relationship(back_populates="task")
     session: Mapped[List["SessionOrm"]] = relationship(back_populates="task")
 
+    __table_args__ = (
+        # keyset-пагинация списка заданий преподавателя: (teacher_fk, time_created, id)
+        Index("ix_tasks_teacher_created_id", "teacher_fk", "time_created", "id"),
+        # поиск по префиксу названия: LIKE 'abc%' использует индекс только с text_pattern_ops
+        Index("ix_tasks_teacher_title", "teacher_fk", "title", postgresql_ops={"title": "text_pattern_ops"}),
+    )
+
 
 class IsStarted(enum.Enum):
     started = "started"
@@ -58,6 +69,10 @@ class IsStarted(enum.Enum):
     finished = "finished"
 
 
+# номера для кодов сессий, каждый nextval резервирует блок из CODE_BLOCK номеров
+session_code_seq = Sequence("session_code_seq", start=0, minvalue=0, increment=CODE_BLOCK, metadata=Base.metadata)
+
+
 class SessionOrm(Base):
     __tablename__ = "sessions"
 
@@ -84,6 +99,85 @@ class TestsOrm(Base):
 
     task: Mapped["TaskOrm"] = relationship(back_populates="tests")
 
+class SubmissionOrm(Base):
+    """Проверенная посылка ученика: итог по всем тестам"""
+    __tablename__ = "submissions"
+
+    id: Mapped[idpk]
+    submission_uid: Mapped[str] = mapped_column(String(32), unique=True)  # id посылки в очереди проверки
+    session_fk: Mapped[int] = mapped_column(ForeignKey("sessions.id"))
+    user_fk: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    task_fk: Mapped[int] = mapped_column(ForeignKey("tasks.id"))
+    language: Mapped[str] = mapped_column(String(16))
+    submitted_at: Mapped[datetime.datetime]
+    verdict: Mapped[str] = mapped_column(String(8))  # первый неуспешный вердикт или OK
+    test_passed: Mapped[int]
+    tests_total: Mapped[int]
+    cpu_time: Mapped[float]
+    max_rss: Mapped[int]  # КБ
+
+    tests: Mapped[List["SubmissionTestOrm"]] = relationship(back_populates="submission")
+
+    __table_args__ = (
+        # история ученика в сессии и выборки по сессии упорядочены по времени отправки
+        Index("ix_submissions_session_user_submitted", "session_fk", "user_fk", "submitted_at"),
+    )
+
+
+class SubmissionTestOrm(Base):
+    """Результат посылки на одном тесте"""
+    __tablename__ = "submission_tests"
+
+    id: Mapped[idpk]
+    submission_fk: Mapped[int] = mapped_column(ForeignKey("submissions.id", ondelete="CASCADE"))
+    test_fk: Mapped[int] = mapped_column(ForeignKey("tests.id", ondelete="CASCADE"))
+    passed: Mapped[bool]
+    verdict: Mapped[str] = mapped_column(String(8))
+    time: Mapped[float]
+    cpu_time: Mapped[float]
+    max_rss: Mapped[int]
+
+    submission: Mapped["SubmissionOrm"] = relationship(back_populates="tests")
+
+    __table_args__ = (
+        Index("ix_submission_tests_submission", "submission_fk"),
+        Index("ix_submission_tests_test", "test_fk"),
+    )
+
+
+class TaskStatsPeriodOrm(Base):
+    """Агрегаты посылок по заданию за период: свежие - по дням, старые сворачиваются в месяцы"""
+    __tablename__ = "task_stats_periods"
+
+    task_fk: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    period: Mapped[str] = mapped_column(String(8), primary_key=True)  # day или month
+    period_start: Mapped[datetime.date] = mapped_column(primary_key=True)
+    submissions: Mapped[int] = mapped_column(default=0)
+    accepted: Mapped[int] = mapped_column(default=0)  # посылки, прошедшие все тесты
+    test_runs: Mapped[int] = mapped_column(default=0)
+    test_passes: Mapped[int] = mapped_column(default=0)
+
+
+class TestStatsOrm(Base):
+    """Агрегаты по тесту за все время, обновляются при записи каждой посылки"""
+    __tablename__ = "test_stats"
+
+    test_fk: Mapped[int] = mapped_column(ForeignKey("tests.id", ondelete="CASCADE"), primary_key=True)
+    task_fk: Mapped[int] = mapped_column(ForeignKey("tasks.id", ondelete="CASCADE"), index=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    passes: Mapped[int] = mapped_column(default=0)
+    time_total: Mapped[float] = mapped_column(default=0.0)
+
+
+class TestTimeBucketOrm(Base):
+    """Гистограмма времени работы на тесте в логарифмических корзинах - для медианы без хранения всех замеров"""
+    __tablename__ = "test_time_buckets"
+
+    test_fk: Mapped[int] = mapped_column(ForeignKey("tests.id", ondelete="CASCADE"), primary_key=True)
+    bucket: Mapped[int] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
+
+
 class CommentsOrm(Base):
     __tablename__ = "comments"
 
@@ -1,24 +1,49 @@
-from sqlalchemy import select, insert, and_, delete, update
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, and_, delete, update, func, cast, literal_column, distinct, String, JSON, Float, Integer, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import aliased
 import datetime
+import functools
+import json
+import time
+from collections.abc import AsyncIterator
 
 
-from src.database import async_session_factory as asf
-from .models import TeachersOrm, TaskOrm, TestsOrm, CommentsOrm, SessionOrm, IsStarted, UserOrm
+from src.database import use_session as asf, async_session_factory
+from src.cache import TTLCache
+from src.config import settings
+from .models import TeachersOrm, TaskOrm, TestsOrm, CommentsOrm, SessionOrm, IsStarted, UserOrm, session_code_seq, \
+    SubmissionOrm, SubmissionTestOrm, TaskStatsPeriodOrm, TestStatsOrm, TestTimeBucketOrm
 from src.schemas.router_db import TeacherRegister
 from src.schemas.from_dbDTO import TeacherInfo, Comments, TaskInfo, Tests, SessionInfo, CompetetorsList, OverviewStartedSession
-from src.utils import PasswordActions, generate_unique_code
-from src.schemas.from_dbDTO import list_of_tasks
+from src.utils import PasswordActions, encode_cursor, decode_cursor
+from src.session_codes import SessionCodeAllocator, FeistelPermutation, load_key
+from src.schemas.from_dbDTO import list_of_tasks, TasksPage
+from src.judge.cache import JudgeCache
+from src.leaderboard import publish_score
+from src.session_index import SessionIndex
+from src.scheduler import deadline_scheduler
+from src.task_stats import runtime_bucket, median_runtime
+from src.metrics import DB_CALL_DURATION, instrument_static_methods
+from src.invalidation import cache_invalidator
+
+
+def session_index_entry(session_id: int, task_id: int, teacher_id: int,
+                        status: IsStarted, deadline_time: datetime.datetime) -> dict:
+    return {"id": session_id, "task_id": task_id, "teacher_id": teacher_id,
+            "status": status.value, "deadline_time": deadline_time.isoformat()}
 
 
 class Users:
+    # task_id -> закодированный ответ /teachers/view_task_info
+    task_info_cache = TTLCache(maxsize=settings.TASK_CACHE_SIZE)
+
     @staticmethod
     async def register_teacher(teacher_info: TeacherRegister):
         async with asf() as session:
             new_teacher = TeachersOrm(
                 name=teacher_info.name,
                 email=teacher_info.email,
-                password_hash=PasswordActions.hash(teacher_info.password)
+                password_hash=await PasswordActions.hash_async(teacher_info.password)
             )
             session.add(new_teacher)
             await session.commit()  
@@ -33,25 +58,50 @@ class Users:
     
 
     @staticmethod
-    async def list_of_tasks():
+    async def update_teacher_password_hash(teacher_email: str, password_hash: str):
         async with asf() as session:
-            query = select(TaskOrm.title, TaskOrm.time_created)
-            result = await session.execute(query)
-            return [list_of_tasks(title=title, time_created=time_created) for title, time_created in result]
+            query = update(TeachersOrm).where(TeachersOrm.email == teacher_email).values(password_hash=password_hash)
+            await session.execute(query)
+            await session.commit()
+
+
+    @staticmethod
+    async def list_of_tasks(teacher_id: int, limit: int = 20, cursor: str | None = None,
+                            title_prefix: str | None = None) -> TasksPage:
+        """Страница заданий преподавателя, новые первыми. cursor - next_cursor предыдущей страницы"""
+        async with asf() as session:
+            query = select(TaskOrm.id, TaskOrm.title, TaskOrm.time_created).where(TaskOrm.teacher_fk == teacher_id)
+            if title_prefix:
+                query = query.where(TaskOrm.title.startswith(title_prefix, autoescape=True))
+            if cursor:
+                # строковое сравнение (time_created, id) < (...) идет по индексу ix_tasks_teacher_created_id
+                query = query.where(tuple_(TaskOrm.time_created, TaskOrm.id) < tuple_(*decode_cursor(cursor)))
+            query = query.order_by(TaskOrm.time_created.desc(), TaskOrm.id.desc()).limit(limit + 1)
+            rows = (await session.execute(query)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].time_created, rows[-1].id)
+        tasks = [list_of_tasks(id=id, title=title, time_created=str(time_created)) for id, title, time_created in rows]
+        return TasksPage(tasks=tasks, next_cursor=next_cursor)
     
 
     @staticmethod
-    async def get_teacher_info_by_email(teacher_email: str) -> TeacherInfo:
+    async def get_teacher_info_by_email(teacher_email: str) -> TeacherInfo | None:
         async with asf() as session:
             query = select(TeachersOrm.id, TeachersOrm.name).where(TeachersOrm.email == teacher_email)
             result = await session.execute(query)
-            return [TeacherInfo(id=id, name=name) for id, name in result]
+            row = result.one_or_none()
+            return TeacherInfo(id=row.id, name=row.name) if row else None
         
 
     @staticmethod
-    async def create_task_return_task_id(title: str, task_text: str, teacher_id: int):
+    async def create_task_return_task_id(title: str, task_text: str, teacher_id: int,
+                                         time_limit: float | None = None, memory_limit: int | None = None):
         async with asf() as session:
-            query = insert(TaskOrm).values(title=title, task_text=task_text, teacher_fk=teacher_id)
+            query = insert(TaskOrm).values(title=title, task_text=task_text, teacher_fk=teacher_id,
+                                           time_limit=time_limit, memory_limit=memory_limit)
             await session.execute(query)
             await session.flush()
             query = select(TaskOrm.id).where(and_(TaskOrm.title == title))
@@ -63,77 +113,169 @@ class Users:
     @staticmethod
     async def add_tests_to_task(list_of_tests: list, task_id: int):
         async with asf() as session:
-            tests = [TestsOrm(input=test.input, output=test.output, task_fk=task_id) for test in list_of_tests]
-            await session.add_all(tests)
-            await session.commit()
+            tests = [{"input": test.input, "output": test.output, "task_fk": task_id} for test in list_of_tests]
+            if tests:
+                await session.execute(insert(TestsOrm), tests)
+                await session.commit()
+        await Users.tests_changed(task_id)
+
+
+    @staticmethod
+    async def import_tests(task_id: int, tests: AsyncIterator, chunk_size: int = 1000) -> int:
+        """Вставляет тесты из асинхронного потока пачками по chunk_size (многострочный INSERT)"""
+        inserted = 0
+        chunk = []
+        try:
+            async with asf() as session:
+                async for test in tests:
+                    chunk.append({"input": test.input, "output": test.output, "task_fk": task_id})
+                    if len(chunk) >= chunk_size:
+                        await session.execute(insert(TestsOrm), chunk)
+                        await session.commit()
+                        inserted += len(chunk)
+                        chunk = []
+                if chunk:
+                    await session.execute(insert(TestsOrm), chunk)
+                    await session.commit()
+                    inserted += len(chunk)
+        finally:
+            # пачки фиксируются по ходу: при ошибке посреди потока часть тестов уже в БД
+            if inserted:
+                await Users.tests_changed(task_id)
+        return inserted
+
+
+    @staticmethod
+    async def tests_changed(task_id: int):
+        """Сбрасывает всё, что зависит от набора тестов задания"""
+        await JudgeCache.invalidate_task(task_id)
+        await cache_invalidator.invalidate("task_info", task_id)
+
+
+    @staticmethod
+    async def get_task_owner(task_id: int) -> int | None:
+        async with asf() as session:
+            query = select(TaskOrm.teacher_fk).where(TaskOrm.id == task_id)
+            result = await session.execute(query)
+            return result.scalar_one_or_none()
 
     
+    @staticmethod
+    async def get_tests_for_task(task_id: int) -> list[Tests]:
+        async with asf() as session:
+            query = select(TestsOrm.id, TestsOrm.input, TestsOrm.output).where(TestsOrm.task_fk == task_id) \
+                .order_by(TestsOrm.id)
+            result = await session.execute(query)
+            return [Tests(id=id, input=input, output=output,
+                          input_type=type(input).__name__, output_type=type(output).__name__)
+                    for id, input, output in result]
+
+
+    @staticmethod
+    async def get_task_limits(task_id: int) -> tuple[float, int]:
+        """(лимит времени в секундах, лимит памяти в МБ) на один тест задания"""
+        async with asf() as session:
+            query = select(TaskOrm.time_limit, TaskOrm.memory_limit).where(TaskOrm.id == task_id)
+            row = (await session.execute(query)).one_or_none()
+        time_limit, memory_limit = row if row is not None else (None, None)
+        return time_limit or settings.JUDGE_TEST_TIMEOUT, memory_limit or settings.JUDGE_MEMORY_LIMIT_MB
+
+
     @staticmethod
     async def view_task_info(task_id: int):
         async with asf() as session:
-            query = select(TaskOrm).options(
-                selectinload(TaskOrm.teacher),  # Load teacher for the task
-                selectinload(TaskOrm.tests),    # Load all tests
-                selectinload(TaskOrm.comments).selectinload(CommentsOrm.teacher)  # Load comments and each comment's teacher
-            ).where(TaskOrm.id == task_id)
-            
+            # тесты и комментарии собираются в json прямо в postgres - один запрос вместо четырех
+            tests = select(func.coalesce(
+                func.json_agg(aggregate_order_by(
+                    func.json_build_object("id", TestsOrm.id, "input", TestsOrm.input, "output", TestsOrm.output), TestsOrm.id)),
+                literal_column("'[]'::json"),
+                type_=JSON,
+            )).where(TestsOrm.task_fk == TaskOrm.id).scalar_subquery()
+
+            comment_author = aliased(TeachersOrm)
+            comments = select(func.coalesce(
+                func.json_agg(aggregate_order_by(
+                    func.json_build_object("text", CommentsOrm.text,
+                                           "time_created", cast(CommentsOrm.time_created, String),
+                                           "teacher_name", comment_author.name),
+                    CommentsOrm.id)),
+                literal_column("'[]'::json"),
+                type_=JSON,
+            )).join(comment_author, CommentsOrm.teacher_fk == comment_author.id) \
+              .where(CommentsOrm.task_fk == TaskOrm.id).scalar_subquery()
+
+            query = select(TaskOrm.title, TaskOrm.task_text, TaskOrm.time_created, TeachersOrm.name,
+                           tests.label("tests"), comments.label("comments")) \
+                .join(TeachersOrm, TaskOrm.teacher_fk == TeachersOrm.id) \
+                .where(TaskOrm.id == task_id)
             result = await session.execute(query)
-            task = result.scalar_one_or_none()
-            
+            task = result.one_or_none()
+
             if task is None:
                 return None  # or raise an exception if preferred
 
-            # Map ORM task to TaskInfo pydantic model
             task_info = TaskInfo(
                 title=task.title,
                 task_text=task.task_text,
                 time_created=str(task.time_created),  # Convert datetime to str if needed
-                teacher_name=task.teacher.name
+                teacher_name=task.name
             )
-            
-            # Map each test to the Tests pydantic model
             tests = [
                 Tests(
-                    input=test.input,
-                    output=test.output,
-                    input_type=type(test.input).__name__,
-                    output_type=type(test.output).__name__
+                    id=test["id"],
+                    input=test["input"],
+                    output=test["output"],
+                    input_type=type(test["input"]).__name__,
+                    output_type=type(test["output"]).__name__
                 ) for test in task.tests
             ]
-            
-            # Map each comment to the Comments pydantic model
-            comments = [
-                Comments(
-                    text=comment.text,
-                    time_created=str(comment.time_created),  # Converting datetime to str if needed
-                    teacher_name=comment.teacher.name
-                ) for comment in task.comments
-            ]
-            
+            comments = [Comments(**comment) for comment in task.comments]
+
             return {"task_info": task_info, "tests": tests, "comments": comments}
-        
+
+
+    @staticmethod
+    async def view_task_info_json(task_id: int) -> bytes | None:
+        """view_task_info, уже закодированный в JSON, через кэш"""
+        payload = Users.task_info_cache.get(task_id)
+        if payload is not None:
+            return payload
+        task = await Users.view_task_info(task_id=task_id)
+        if task is None:
+            return None
+        payload = json.dumps({
+            "task_info": task["task_info"].model_dump(),
+            "tests": [test.model_dump() for test in task["tests"]],
+            "comments": [comment.model_dump() for comment in task["comments"]],
+        }, ensure_ascii=False).encode()
+        Users.task_info_cache.set(task_id, payload, expires_at=time.time() + settings.TASK_CACHE_TTL)
+        return payload
+
     @staticmethod
     async def delete_task(task_id: int):
         async with asf() as session:
             query = delete(TaskOrm).where(TaskOrm.id == task_id)
             await session.execute(query)
             await session.commit()
+        await cache_invalidator.invalidate("task_info", task_id)
 
     #update
     @staticmethod
     async def update_task_title(task_id: int, content: str):
         async with asf() as session:
-            query = update(TaskOrm.title).where(TaskOrm.id == task_id).values(content)
+            query = update(TaskOrm).where(TaskOrm.id == task_id).values(title=content)
             await session.execute(query)
             await session.commit()
+        await cache_invalidator.invalidate("task_info", task_id)
 
 
     @staticmethod
     async def update_task_text(task_id: int, content: str):
         async with asf() as session:
-            query = update(TaskOrm.task_text).where(TaskOrm.id == task_id).values(content)
+            query = update(TaskOrm).where(TaskOrm.id == task_id).values(task_text=content)
             await session.execute(query)
             await session.commit()
+        await cache_invalidator.invalidate("task_info", task_id)
 
     
     @staticmethod
@@ -142,28 +284,51 @@ class Users:
             query = insert(CommentsOrm).values(text=comment, task_fk=task_id, teacher_fk=teacher_id)
             await session.execute(query)
             await session.commit()
+        await cache_invalidator.invalidate("task_info", task_id)
 
     
     #session
     @staticmethod
-    async def create_session(teacher_id: int, task_id: int, deadline_time: datetime.datetime):
+    async def create_session(teacher_id: int, task_id: int, deadline_time: datetime.datetime) -> str:
         async with asf() as session:
-            unique_code = generate_unique_code()
+            unique_code = await session_code_allocator().allocate()
             query = insert(SessionOrm).values(deadline_time=deadline_time,
                                               task_fk=task_id, teacher_fk=teacher_id, 
-                                              unique_code=unique_code)
-            await session.execute(query)
+                                              unique_code=unique_code).returning(SessionOrm.id)
+            result = await session.execute(query)
+            session_id = result.scalar_one()
             await session.commit()
+        await SessionIndex.add(unique_code, session_index_entry(session_id, task_id, teacher_id,
+                                                                IsStarted.pending, deadline_time))
+        deadline_scheduler.schedule(session_id, deadline_time)
+        return unique_code
 
     
+    @staticmethod
+    async def reserve_session_code_block() -> int:
+        async with asf() as session:
+            result = await session.execute(select(session_code_seq.next_value()))
+            return result.scalar_one()
+
+
     @staticmethod
     async def look_for_teacher_session_and_return_unique_code(teacher_id: int):
         async with asf() as session:
-            query = select(SessionOrm.unique_code).where(SessionOrm.teacher_fk == teacher_id)
+            query = select(SessionOrm.unique_code).where(SessionOrm.teacher_fk == teacher_id,
+                                                         SessionOrm.status != IsStarted.finished)
             result = await session.execute(query)
             return result.scalar_one_or_none()
         
 
+    @staticmethod
+    async def view_session_info(session_id: int):
+        """(id, unique_code, status) сессии или None"""
+        async with asf() as session:
+            query = select(SessionOrm.id, SessionOrm.unique_code, SessionOrm.status).where(SessionOrm.id == session_id)
+            result = await session.execute(query)
+            return result.one_or_none()
+
+
     @staticmethod
     async def get_session_info_by_id(id: int):
         async with asf() as session:
@@ -176,9 +341,16 @@ class Users:
     @staticmethod
     async def session_change_status(session_id: int, status: IsStarted):
         async with asf() as session:
-            query = update(SessionOrm).where(SessionOrm.id == session_id).values(status=status)
-            await session.execute(query)
+            query = update(SessionOrm).where(SessionOrm.id == session_id).values(status=status).returning(
+                SessionOrm.unique_code, SessionOrm.task_fk, SessionOrm.teacher_fk, SessionOrm.deadline_time)
+            result = await session.execute(query)
+            row = result.one_or_none()
             await session.commit()
+        if row is not None:
+            await SessionIndex.set_status(row.unique_code, session_index_entry(
+                session_id, row.task_fk, row.teacher_fk, status, row.deadline_time))
+        if status == IsStarted.finished:
+            deadline_scheduler.cancel(session_id)
         
 
     @staticmethod
@@ -190,4 +362,327 @@ class Users:
             query = select(UserOrm.name).where(UserOrm.session_fk == session_info.id)
             result = await session.execute(query)
             users = [CompetetorsList(name=name) for name in result.scalars()]
-            return OverviewStartedSession(session_info=session_info, competetors_list=users)   
\ No newline at end of file
+            return OverviewStartedSession(session_info=session_info, competetors_list=users)
+
+
+    #judge
+    @staticmethod
+    async def get_participant_session(user_id: int):
+        """(id, task_fk, status) сессии участника или None"""
+        async with asf() as session:
+            query = select(SessionOrm.id, SessionOrm.task_fk, SessionOrm.status) \
+                .join(UserOrm, UserOrm.session_fk == SessionOrm.id).where(UserOrm.id == user_id)
+            result = await session.execute(query)
+            return result.one_or_none()
+
+
+    @staticmethod
+    async def get_unfinished_session_deadlines() -> list[tuple[int, datetime.datetime]]:
+        async with asf() as session:
+            query = select(SessionOrm.id, SessionOrm.deadline_time).where(SessionOrm.status != IsStarted.finished)
+            result = await session.execute(query)
+            return [(id, deadline_time) for id, deadline_time in result]
+
+
+    @staticmethod
+    async def get_session_status(session_id: int) -> IsStarted | None:
+        async with asf() as session:
+            result = await session.execute(select(SessionOrm.status).where(SessionOrm.id == session_id))
+            return result.scalar_one_or_none()
+
+
+    @staticmethod
+    async def finish_session_if_due(session_id: int) -> bool:
+        """Переводит сессию в finished, если дедлайн прошел и она еще не завершена.
+
+        Условие в самом UPDATE делает операцию идемпотентной: из нескольких
+        процессов, сработавших на один дедлайн, сессию завершит только один
+        """
+        async with asf() as session:
+            query = update(SessionOrm).where(
+                SessionOrm.id == session_id,
+                SessionOrm.status != IsStarted.finished,
+                SessionOrm.deadline_time <= func.timezone("utc", func.now()),
+            ).values(status=IsStarted.finished).returning(
+                SessionOrm.unique_code, SessionOrm.task_fk, SessionOrm.teacher_fk, SessionOrm.deadline_time)
+            result = await session.execute(query)
+            row = result.one_or_none()
+            await session.commit()
+        if row is None:
+            return False
+        await SessionIndex.set_status(row.unique_code, session_index_entry(
+            session_id, row.task_fk, row.teacher_fk, IsStarted.finished, row.deadline_time))
+        return True
+
+
+    @staticmethod
+    async def update_test_passed(user_id: int, test_passed: int):
+        async with asf() as session:
+            # сохраняем лучший результат ученика, а не последний
+            query = update(UserOrm).where(UserOrm.id == user_id).values(
+                test_passed=func.greatest(UserOrm.test_passed, test_passed)
+            ).returning(UserOrm.session_fk, UserOrm.name, UserOrm.test_passed)
+            result = await session.execute(query)
+            row = result.one_or_none()
+            await session.commit()
+        if row is not None:
+            await publish_score(session_id=row.session_fk, user_id=user_id, name=row.name, test_passed=row.test_passed)
+
+
+    @staticmethod
+    async def get_session_scores(session_id: int) -> list[dict]:
+        async with asf() as session:
+            query = select(UserOrm.id, UserOrm.name, UserOrm.test_passed).where(UserOrm.session_fk == session_id)
+            result = await session.execute(query)
+            return [{"user_id": id, "name": name, "test_passed": test_passed} for id, name, test_passed in result]
+
+
+    @staticmethod
+    async def get_active_session_info(unique_code: str) -> dict | None:
+        async with asf() as session:
+            query = select(SessionOrm.id, SessionOrm.task_fk, SessionOrm.teacher_fk,
+                           SessionOrm.status, SessionOrm.deadline_time).where(
+                SessionOrm.unique_code == unique_code,
+                SessionOrm.status.in_([IsStarted.pending, IsStarted.started]))
+            result = await session.execute(query)
+            row = result.one_or_none()
+            return session_index_entry(*row) if row else None
+
+
+    @staticmethod
+    async def add_users(participants: list[tuple[int, str]]) -> list[int]:
+        """Многострочная вставка участников, id возвращаются в порядке participants"""
+        async with asf() as session:
+            query = insert(UserOrm).returning(UserOrm.id, sort_by_parameter_order=True)
+            result = await session.execute(query, [{"session_fk": session_id, "name": name}
+                                                   for session_id, name in participants])
+            user_ids = list(result.scalars())
+            await session.commit()
+            return user_ids
+
+
+    #results
+    @staticmethod
+    async def record_submission(submission_uid: str, user_id: int, session_id: int, task_id: int, language: str,
+                                submitted_at: float, results: list[dict]):
+        """Сохраняет проверенную посылку и ее результаты по тестам в историю.
+
+        Повторная запись той же посылки (задачу перепроверили после падения воркера) ничего не делает
+        """
+        verdict = next((result["verdict"] for result in results if result.get("verdict", "OK") != "OK"), "OK")
+        submitted = datetime.datetime.fromtimestamp(submitted_at, datetime.timezone.utc).replace(tzinfo=None)
+        test_passed = sum(bool(result.get("passed")) for result in results)
+        async with asf() as session:
+            query = pg_insert(SubmissionOrm).values(
+                submission_uid=submission_uid, session_fk=session_id, user_fk=user_id, task_fk=task_id,
+                language=language,
+                submitted_at=submitted,
+                verdict=verdict,
+                test_passed=test_passed,
+                tests_total=len(results),
+                cpu_time=sum(result.get("cpu_time", 0.0) for result in results),
+                max_rss=max((result.get("max_rss", 0) for result in results), default=0),
+            ).on_conflict_do_nothing(index_elements=["submission_uid"]).returning(SubmissionOrm.id)
+            submission_id = (await session.execute(query)).scalar_one_or_none()
+            if submission_id is None:
+                return None
+            rows = [{
+                "submission_fk": submission_id, "test_fk": result["id"], "passed": bool(result.get("passed")),
+                "verdict": result.get("verdict", "OK"), "time": result.get("time", 0.0),
+                "cpu_time": result.get("cpu_time", 0.0), "max_rss": result.get("max_rss", 0),
+            } for result in results if result.get("id") is not None]  # у старых записей кэша нет id теста
+            if rows:
+                await session.execute(insert(SubmissionTestOrm).values(rows))
+            await Users._add_task_stats(session, task_id=task_id, day=submitted.date(),
+                                        accepted=bool(results) and test_passed == len(results), rows=rows)
+            await session.commit()
+        return submission_id
+
+
+    @staticmethod
+    async def _add_task_stats(session, task_id: int, day: datetime.date, accepted: bool, rows: list[dict]):
+        """Инкрементально добавляет посылку в агрегаты задания и тестов (в транзакции записи посылки)"""
+        period = pg_insert(TaskStatsPeriodOrm).values(
+            task_fk=task_id, period="day", period_start=day, submissions=1, accepted=int(accepted),
+            test_runs=len(rows), test_passes=sum(row["passed"] for row in rows),
+        )
+        added = ("submissions", "accepted", "test_runs", "test_passes")
+        await session.execute(period.on_conflict_do_update(
+            index_elements=["task_fk", "period", "period_start"],
+            set_={name: getattr(TaskStatsPeriodOrm, name) + getattr(period.excluded, name) for name in added},
+        ))
+        if not rows:
+            return
+        # строки тестов блокируются в порядке test_fk - параллельные воркеры не ловят deadlock
+        rows = sorted(rows, key=lambda row: row["test_fk"])
+        tests = pg_insert(TestStatsOrm).values([{
+            "test_fk": row["test_fk"], "task_fk": task_id, "attempts": 1, "passes": int(row["passed"]),
+            "time_total": row["time"],
+        } for row in rows])
+        await session.execute(tests.on_conflict_do_update(
+            index_elements=["test_fk"],
+            set_={name: getattr(TestStatsOrm, name) + getattr(tests.excluded, name)
+                  for name in ("attempts", "passes", "time_total")},
+        ))
+        # время TLE обрезано лимитом, а CE не запускался - в медиану не идут
+        timed = [row for row in rows if row["verdict"] not in ("TLE", "CE")]
+        if timed:
+            buckets = pg_insert(TestTimeBucketOrm).values([
+                {"test_fk": row["test_fk"], "bucket": runtime_bucket(row["time"]), "count": 1} for row in timed
+            ])
+            await session.execute(buckets.on_conflict_do_update(
+                index_elements=["test_fk", "bucket"],
+                set_={"count": TestTimeBucketOrm.count + buckets.excluded.count},
+            ))
+
+
+    @staticmethod
+    async def compact_task_stats(before: datetime.date) -> int:
+        """Сворачивает дневные агрегаты заданий до before в месячные одним запросом; возвращает число месячных строк"""
+        async with asf() as session:
+            moved = delete(TaskStatsPeriodOrm).where(
+                TaskStatsPeriodOrm.period == "day", TaskStatsPeriodOrm.period_start < before,
+            ).returning(*TaskStatsPeriodOrm.__table__.c).cte("moved")
+            month = cast(func.date_trunc(literal_column("'month'"), moved.c.period_start), TaskStatsPeriodOrm.period_start.type)
+            added = ("submissions", "accepted", "test_runs", "test_passes")
+            folded = select(
+                moved.c.task_fk, literal_column("'month'"), month, *(func.sum(moved.c[name]) for name in added),
+            ).group_by(moved.c.task_fk, month)
+            query = pg_insert(TaskStatsPeriodOrm).from_select(["task_fk", "period", "period_start", *added], folded)
+            query = query.on_conflict_do_update(
+                index_elements=["task_fk", "period", "period_start"],
+                set_={name: getattr(TaskStatsPeriodOrm, name) + getattr(query.excluded, name) for name in added},
+            )
+            result = await session.execute(query)
+            await session.commit()
+            return result.rowcount
+
+
+    @staticmethod
+    async def get_task_analytics(task_id: int) -> dict:
+        """Статистика задания из агрегатов: объем чтения зависит от числа тестов и периодов, а не посылок"""
+        async with asf() as session:
+            periods = (await session.execute(
+                select(TaskStatsPeriodOrm.period, TaskStatsPeriodOrm.period_start, TaskStatsPeriodOrm.submissions,
+                       TaskStatsPeriodOrm.accepted, TaskStatsPeriodOrm.test_runs, TaskStatsPeriodOrm.test_passes)
+                .where(TaskStatsPeriodOrm.task_fk == task_id).order_by(TaskStatsPeriodOrm.period_start)
+            )).mappings().all()
+            tests = (await session.execute(
+                select(TestStatsOrm.test_fk, TestStatsOrm.attempts, TestStatsOrm.passes, TestStatsOrm.time_total)
+                .where(TestStatsOrm.task_fk == task_id)
+            )).all()
+            buckets = (await session.execute(
+                select(TestTimeBucketOrm.test_fk, TestTimeBucketOrm.bucket, TestTimeBucketOrm.count)
+                .join(TestStatsOrm, TestStatsOrm.test_fk == TestTimeBucketOrm.test_fk)
+                .where(TestStatsOrm.task_fk == task_id)
+                .order_by(TestTimeBucketOrm.test_fk, TestTimeBucketOrm.bucket)
+            )).all()
+        histograms: dict[int, list[tuple[int, int]]] = {}
+        for test_id, bucket, count in buckets:
+            histograms.setdefault(test_id, []).append((bucket, count))
+        test_stats = [{
+            "test_id": test_id, "attempts": attempts, "passes": passes,
+            "pass_rate": passes / attempts if attempts else None,
+            "avg_time": time_total / attempts if attempts else None,
+            "median_time": median_runtime(histograms.get(test_id, [])),
+        } for test_id, attempts, passes, time_total in tests]
+        # самые проваливаемые тесты - первыми
+        test_stats.sort(key=lambda test: (test["pass_rate"] is None, test["pass_rate"], test["test_id"]))
+        submissions = sum(period["submissions"] for period in periods)
+        accepted = sum(period["accepted"] for period in periods)
+        return {
+            "task_id": task_id,
+            "submissions": submissions,
+            "accepted": accepted,
+            "acceptance_rate": accepted / submissions if submissions else None,
+            "periods": [{**period, "period_start": period["period_start"].isoformat(),
+                         "test_pass_rate": period["test_passes"] / period["test_runs"] if period["test_runs"] else None}
+                        for period in periods],
+            "tests": test_stats,
+        }
+
+
+    @staticmethod
+    def _session_ranking_query(session_id: int):
+        # лучшая попытка ученика - больше всего тестов, при равенстве - самая ранняя
+        best = select(
+            SubmissionOrm.user_fk, SubmissionOrm.test_passed, SubmissionOrm.tests_total,
+            SubmissionOrm.verdict, SubmissionOrm.submitted_at,
+            func.row_number().over(partition_by=SubmissionOrm.user_fk,
+                                   order_by=(SubmissionOrm.test_passed.desc(), SubmissionOrm.submitted_at))
+                .label("attempt_rank"),
+            func.count().over(partition_by=SubmissionOrm.user_fk).label("attempts"),
+        ).where(SubmissionOrm.session_fk == session_id).subquery("best")
+        test_passed = func.coalesce(best.c.test_passed, 0)
+        place = func.rank().over(order_by=(test_passed.desc(), best.c.submitted_at.asc().nulls_last())).label("place")
+        return select(
+            place, UserOrm.id.label("user_id"), UserOrm.name, test_passed.label("test_passed"),
+            best.c.tests_total, best.c.verdict, func.coalesce(best.c.attempts, 0).label("attempts"),
+            best.c.submitted_at.label("best_submitted_at"),
+        ).outerjoin(best, and_(best.c.user_fk == UserOrm.id, best.c.attempt_rank == 1)) \
+            .where(UserOrm.session_fk == session_id).order_by(place, UserOrm.id)
+
+
+    @staticmethod
+    async def get_session_ranking(session_id: int) -> list[dict]:
+        """Место, лучшая попытка и число попыток каждого ученика сессии (включая не отправивших решение)"""
+        async with asf() as session:
+            result = await session.execute(Users._session_ranking_query(session_id))
+            return [dict(row) for row in result.mappings()]
+
+
+    @staticmethod
+    async def stream_session_ranking(session_id: int, batch_size: int = 1000) -> AsyncIterator[dict]:
+        """То же, что get_session_ranking, но построчно через серверный курсор - для выгрузки больших сессий"""
+        # своя сессия: ответ отдается потоком уже после закрытия сессии запроса
+        async with async_session_factory() as session:
+            query = Users._session_ranking_query(session_id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for row in result.mappings():
+                yield dict(row)
+
+
+    @staticmethod
+    async def get_session_test_stats(session_id: int) -> list[dict]:
+        """По каждому тесту: сколько учеников его пробовали и прошли хотя бы раз, доля прошедших попыток"""
+        async with asf() as session:
+            students = func.count(distinct(SubmissionOrm.user_fk))
+            students_passed = func.count(distinct(SubmissionOrm.user_fk)).filter(SubmissionTestOrm.passed)
+            query = select(
+                SubmissionTestOrm.test_fk.label("test_id"),
+                func.count().label("attempts"),
+                # boolean в Postgres приводится к числу только через integer
+                func.avg(cast(cast(SubmissionTestOrm.passed, Integer), Float)).label("attempt_pass_rate"),
+                students.label("students"),
+                students_passed.label("students_passed"),
+                (cast(students_passed, Float) / cast(func.nullif(students, 0), Float)).label("pass_rate"),
+                func.avg(SubmissionTestOrm.time).label("avg_time"),
+            ).join(SubmissionOrm, SubmissionOrm.id == SubmissionTestOrm.submission_fk) \
+                .where(SubmissionOrm.session_fk == session_id) \
+                .group_by(SubmissionTestOrm.test_fk).order_by(SubmissionTestOrm.test_fk)
+            result = await session.execute(query)
+            return [dict(row) for row in result.mappings()]
+
+
+    @staticmethod
+    async def get_session_by_code(unique_code: str):
+        """(id, teacher_fk, status) сессии по коду или None"""
+        async with asf() as session:
+            query = select(SessionOrm.id, SessionOrm.teacher_fk, SessionOrm.status).where(SessionOrm.unique_code == unique_code)
+            result = await session.execute(query)
+            return result.one_or_none()
+
+
+# время каждого Users.* в db_call_duration_seconds{method=...}
+instrument_static_methods(Users, DB_CALL_DURATION)
+# изменения заданий в одном процессе API сбрасывают кэш view_task_info во всех
+cache_invalidator.register("task_info", Users.task_info_cache)
+
+
+@functools.cache
+def session_code_allocator() -> SessionCodeAllocator:
+    # ключ создается однократно при запуске (serve.py), импорт модуля его не трогает
+    return SessionCodeAllocator(
+        FeistelPermutation(key=load_key(settings.SESSION_CODE_KEY_PATH)),
+        reserve_block=Users.reserve_session_code_block,
+    )
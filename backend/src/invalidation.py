@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+
+from redis.exceptions import RedisError
+
+from src.cache import TTLCache
+from src.redis_client import redis_client
+
+
+CHANNEL = "cache:invalidate"
+
+logger = logging.getLogger(__name__)
+
+
+class CacheInvalidator:
+    """Согласует кэши в памяти процессов API через Redis pub/sub.
+
+    Кэш регистрируется под именем; invalidate() сразу удаляет ключ у себя и рассылает
+    его остальным процессам. Свои же сообщения процесс пропускает (сравнение origin).
+    Доставка pub/sub не гарантирована (например, при переподключении к Redis),
+    поэтому TTL записей остается верхней границей устаревания
+    """
+
+    def __init__(self):
+        self.caches: dict[str, TTLCache] = {}
+        self.origin = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, name: str, cache: TTLCache):
+        self.caches[name] = cache
+
+    async def invalidate(self, name: str, key):
+        self.caches[name].pop(key)
+        message = json.dumps({"cache": name, "key": key, "origin": self.origin})
+        try:
+            await redis_client.publish(CHANNEL, message)
+        except RedisError as e:
+            # изменение уже в БД, другие процессы увидят его по истечении TTL
+            logger.warning("cache invalidation not published: %s", e)
+
+    def apply(self, message: dict):
+        if message["origin"] == self.origin:
+            return
+        cache = self.caches.get(message["cache"])
+        if cache is not None:
+            cache.pop(message["key"])
+
+    async def run(self):
+        """Слушает рассылку, запускается из lifespan приложения"""
+        subscribed_before = False
+        while True:
+            try:
+                async with redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    if subscribed_before:
+                        # после переподключения часть сообщений могла потеряться - сбрасываем всё
+                        for cache in self.caches.values():
+                            cache.clear()
+                    # первая подписка идет сразу после прогрева (src.warmup) - его кэш не трогаем
+                    subscribed_before = True
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        try:
+                            self.apply(json.loads(message["data"]))
+                        except Exception as e:
+                            # чужое или битое сообщение не должно останавливать слушателя
+                            logger.warning("bad cache invalidation message %r: %s", message["data"], e)
+            except RedisError as e:
+                logger.warning("cache invalidation listener: %s", e)
+                await asyncio.sleep(1)
+
+
+cache_invalidator = CacheInvalidator()
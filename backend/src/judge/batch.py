@@ -0,0 +1,35 @@
+from backend.docker_lib_nekit.docker_sandbox.sandbox import IMAGES, Runner, Verdict
+from src.schemas.from_dbDTO import Tests, UserTestResult
+from .checker import check_all
+
+
+def judge_batch(container: IMAGES, runner: Runner, code: str, tests: list[Tests], time_limit: float = 2.0,
+                memory_limit: int = 256) -> list[UserTestResult]:
+    """Проверяет решение на всех тестах задания за один запуск в контейнере (компиляция - один раз).
+
+    Песочница ставит вердикты по ресурсам и коду выхода, ответы сверяет checker по типам тестов
+    """
+    runs = runner.judge(container, code, tests=[(str(test.input), None) for test in tests],
+                        time_limit=time_limit, memory_limit=memory_limit)
+    checks = check_all([run.output if run.verdict == Verdict.OK else None for run in runs], tests)
+    results = []
+    for test, run, check in zip(tests, runs, checks):
+        verdict = run.verdict
+        if check is not None and not check.passed:
+            verdict = Verdict.WA
+        results.append(UserTestResult(
+            **test.model_dump(),
+            user_output=run.output,
+            passed=verdict == Verdict.OK,
+            verdict=verdict.value,
+            checker_message=check.message if check is not None else None,
+            error=run.error,
+            timed_out=verdict == Verdict.TLE,
+            time=run.time,
+            cpu_time=run.cpu_time,
+            max_rss=run.max_rss,
+            exit_code=run.exit_code,
+            oom_killed=run.oom_killed,
+            runner_failed=run.runner_failed,
+        ))
+    return results
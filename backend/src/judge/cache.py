@@ -0,0 +1,102 @@
+import hashlib
+import json
+import time
+
+from src.config import settings
+from src.redis_client import redis_client
+
+
+CACHE_PREFIX = "judge:cache:"
+LRU_KEY = "judge:cache:lru"
+HITS_KEY = "judge:cache:hits"
+MISSES_KEY = "judge:cache:misses"
+IMAGE_TAG_KEY = "judge:image_tag"
+
+
+def tests_version_key(task_id: int) -> str:
+    return f"judge:tests_version:{task_id}"
+
+
+def normalize_code(code: str) -> str:
+    """Приводит к одному виду только переводы строк: пробелы могут быть внутри строковых литералов"""
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _prune_expired(pipe):
+    # TTL записи продлевается при каждом попадании, поэтому запись с оценкой в LRU старше TTL уже истекла
+    pipe.zremrangebyscore(LRU_KEY, "-inf", time.time() - settings.JUDGE_CACHE_TTL)
+
+
+class JudgeCache:
+    """Кэш вердиктов по хешу (код, задание, версия тестов, образ).
+
+    Записи истекают через JUDGE_CACHE_TTL после последнего обращения; сверх
+    JUDGE_CACHE_MAX_ENTRIES вытесняются давно не использованные (zset LRU_KEY)
+    """
+
+    @staticmethod
+    async def make_key(code: str, task_id: int, language: str = "python") -> str | None:
+        image_tag, version = await redis_client.mget(IMAGE_TAG_KEY, tests_version_key(task_id))
+        if image_tag is None:
+            # воркеры еще не собрали образ - кэшировать не с чем
+            return None
+        digest = hashlib.sha256()
+        for part in (normalize_code(code), str(task_id), version or "0", image_tag, language):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    async def get(key: str) -> dict | None:
+        cached = await redis_client.get(CACHE_PREFIX + key)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if cached is None:
+                pipe.incr(MISSES_KEY)
+            else:
+                pipe.incr(HITS_KEY)
+                pipe.expire(CACHE_PREFIX + key, settings.JUDGE_CACHE_TTL)
+                pipe.zadd(LRU_KEY, {key: time.time()})
+            await pipe.execute()
+        return json.loads(cached) if cached is not None else None
+
+    @staticmethod
+    async def set(key: str, results: list[dict], test_passed: int):
+        value = json.dumps({"results": results, "test_passed": test_passed})
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(CACHE_PREFIX + key, value, ex=settings.JUDGE_CACHE_TTL)
+            pipe.zadd(LRU_KEY, {key: time.time()})
+            _prune_expired(pipe)
+            pipe.zcard(LRU_KEY)
+            *_, size = await pipe.execute()
+        if size > settings.JUDGE_CACHE_MAX_ENTRIES:
+            await JudgeCache._evict(size - settings.JUDGE_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    async def _evict(count: int):
+        evicted = await redis_client.zpopmin(LRU_KEY, count)
+        if evicted:
+            await redis_client.delete(*(CACHE_PREFIX + key for key, _ in evicted))
+
+    @staticmethod
+    async def invalidate_task(task_id: int):
+        """Меняет версию тестов задания, после чего старые записи больше не находятся и истекают по TTL"""
+        await redis_client.incr(tests_version_key(task_id))
+
+    @staticmethod
+    async def set_image_tag(tag: str):
+        await redis_client.set(IMAGE_TAG_KEY, tag)
+
+    @staticmethod
+    async def stats() -> dict:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.mget(HITS_KEY, MISSES_KEY)
+            _prune_expired(pipe)
+            pipe.zcard(LRU_KEY)
+            (hits, misses), _, entries = await pipe.execute()
+        hits, misses = int(hits or 0), int(misses or 0)
+        return {
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "cache_entries": entries,
+        }
@@ -0,0 +1,191 @@
+import math
+import re
+from collections.abc import Iterator
+
+from src.schemas.from_dbDTO import Tests
+
+
+TOKEN_RE = re.compile(r"\S+")
+SPACE_RE = re.compile(r"\s")
+# число в текстовом ответе: без подчеркиваний, ведущих нулей, inf/nan, которые принимает float()
+NUMBER_RE = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+# размер куска вывода, который разбирается на токены за раз
+CHUNK_SIZE = 1 << 16
+# абсолютная и относительная погрешность для вещественных ответов
+FLOAT_TOLERANCE = 1e-6
+TRUE_TOKENS = frozenset(("true", "1", "yes"))
+FALSE_TOKENS = frozenset(("false", "0", "no"))
+
+
+class CheckResult:
+    def __init__(self, passed: bool, message: str | None = None):
+        self.passed = passed
+        self.message = message  # первое расхождение для ученика, если ответ неверный
+
+
+ACCEPTED = CheckResult(passed=True)
+
+
+def iter_tokens(text: str) -> Iterator[str]:
+    """Токены по пробельным символам без копии всего текста (переводы строк, табуляции и пробелы эквивалентны)"""
+    return (match.group() for match in TOKEN_RE.finditer(text))
+
+
+def iter_token_chunks(text: str, chunk_size: int = CHUNK_SIZE) -> Iterator[list[str]]:
+    """Токены пачками примерно по chunk_size символов; граница пачки не режет токен"""
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            space = SPACE_RE.search(text, end)
+            end = space.start() if space else length
+        # копируется только кусок, а не весь вывод
+        yield text[start:end].split()
+        start = end
+
+
+def _preview(token: str | None) -> str:
+    if token is None:
+        return "конец вывода"
+    return repr(token if len(token) <= 40 else token[:40] + "...")
+
+
+def _floats_equal(got: float, expected: float) -> bool:
+    if math.isnan(expected):
+        return math.isnan(got)
+    return math.isclose(got, expected, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE)
+
+
+def _tokens_equal(got: str, expected: str) -> bool:
+    if got == expected:
+        return True
+    # числа в текстовом ответе сравниваются с погрешностью, остальное - только точно
+    if NUMBER_RE.fullmatch(got) and NUMBER_RE.fullmatch(expected):
+        return _floats_equal(float(got), float(expected))
+    return False
+
+
+def compare_tokens(output: str, expected: str) -> CheckResult:
+    """Потоковое сравнение по токенам, кусками: куски сравниваются целиком,
+    по одному токену - только кусок с расхождением (там же допуск для чисел)
+    """
+    got_chunks, want_chunks = iter_token_chunks(output), iter_token_chunks(expected)
+    got, want = [], []
+    got_at = want_at = 0
+    position = 0  # сколько токенов уже совпало
+    while True:
+        if got_at == len(got):
+            got, got_at = next(got_chunks, None), 0
+        if want_at == len(want):
+            want, want_at = next(want_chunks, None), 0
+        if got is None or want is None:
+            break
+        count = min(len(got) - got_at, len(want) - want_at)
+        if got[got_at:got_at + count] != want[want_at:want_at + count]:
+            for offset in range(count):
+                if not _tokens_equal(got[got_at + offset], want[want_at + offset]):
+                    return CheckResult(False, f"токен {position + offset + 1}: ожидалось "
+                                              f"{_preview(want[want_at + offset])}, получено {_preview(got[got_at + offset])}")
+        got_at += count
+        want_at += count
+        position += count
+    # пустые куски (одни пробелы) пропускаются
+    while got is not None and got_at == len(got):
+        got, got_at = next(got_chunks, None), 0
+    while want is not None and want_at == len(want):
+        want, want_at = next(want_chunks, None), 0
+    if got is not None:
+        return CheckResult(False, f"токен {position + 1}: лишний вывод {_preview(got[got_at])}")
+    if want is not None:
+        return CheckResult(False, f"вывод закончился раньше, ожидалось {_preview(want[want_at])}")
+    return ACCEPTED
+
+
+def _single_token(output: str) -> tuple[str | None, CheckResult | None]:
+    tokens = iter_tokens(output)
+    token = next(tokens, None)
+    if token is None:
+        return None, CheckResult(False, "пустой вывод")
+    extra = next(tokens, None)
+    if extra is not None:
+        return None, CheckResult(False, f"ожидалось одно значение, лишний вывод {_preview(extra)}")
+    return token, None
+
+
+def check_int(output: str, expected: int) -> CheckResult:
+    token, error = _single_token(output)
+    if error:
+        return error
+    try:
+        got = int(token)
+    except ValueError:
+        return CheckResult(False, f"ожидалось целое число, получено {_preview(token)}")
+    return ACCEPTED if got == expected else CheckResult(False, f"ожидалось {expected}, получено {got}")
+
+
+def check_float(output: str, expected: float) -> CheckResult:
+    token, error = _single_token(output)
+    if error:
+        return error
+    try:
+        got = float(token)
+    except ValueError:
+        return CheckResult(False, f"ожидалось число, получено {_preview(token)}")
+    if _floats_equal(got, expected):
+        return ACCEPTED
+    return CheckResult(False, f"ожидалось {expected} (±{FLOAT_TOLERANCE:g}), получено {got}")
+
+
+def check_bool(output: str, expected: bool) -> CheckResult:
+    token, error = _single_token(output)
+    if error:
+        return error
+    lowered = token.lower()
+    if lowered not in TRUE_TOKENS and lowered not in FALSE_TOKENS:
+        return CheckResult(False, f"ожидалось True/False, получено {_preview(token)}")
+    return ACCEPTED if (lowered in TRUE_TOKENS) == expected else CheckResult(False, f"ожидалось {expected}")
+
+
+def check_str(output: str, expected: str) -> CheckResult:
+    # быстрый путь без разбора на токены: совпадение с точностью до хвостовых пробелов и \r
+    if output == expected or output.rstrip() == expected.rstrip():
+        return ACCEPTED
+    if "\r" in output and output.replace("\r\n", "\n").rstrip() == expected.rstrip():
+        return ACCEPTED
+    return compare_tokens(output, expected)
+
+
+CHECKERS = {
+    "bool": check_bool,
+    "int": check_int,
+    "float": check_float,
+    "str": check_str,
+}
+
+
+def check_output(output: str, expected: str | int | float | bool, output_type: str) -> CheckResult:
+    """Сравнивает вывод решения с ожидаемым значением по типу, сохраненному у теста"""
+    checker = CHECKERS.get(output_type, check_str)
+    if checker is check_str:
+        expected = str(expected)
+    return checker(output, expected)
+
+
+def check_all(outputs: list[str | None], tests: list[Tests]) -> list[CheckResult | None]:
+    """Проверяет выводы по всем тестам посылки за один проход.
+
+    None в outputs - тест не дошел до сравнения (TLE/MLE/RE/CE), для него результат тоже None.
+    Одинаковые пары (вывод, ожидаемое) сравниваются один раз
+    """
+    seen: dict[tuple[str, str, str], CheckResult] = {}
+    results = []
+    for output, test in zip(outputs, tests):
+        if output is None:
+            results.append(None)
+            continue
+        key = (output, str(test.output), test.output_type)
+        result = seen.get(key)
+        if result is None:
+            result = seen[key] = check_output(output, test.output, test.output_type)
+        results.append(result)
+    return results
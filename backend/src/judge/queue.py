@@ -0,0 +1,226 @@
+import json
+import time
+import uuid
+
+from src.config import settings
+from src.redis_client import redis_client
+
+
+QUEUE_KEY = "judge:queue"
+# проверяющие с их списками задач в работе; живой проверяющий продлевает свой heartbeat
+WORKERS_KEY = "judge:workers"
+LATENCY_KEY = "judge:latency"
+LATENCY_SAMPLES = 1000
+
+
+def submission_key(submission_id: str) -> str:
+    return f"judge:submission:{submission_id}"
+
+
+def pending_key(session_id: int) -> str:
+    return f"judge:pending:{session_id}"
+
+
+def finalize_key(session_id: int) -> str:
+    return f"judge:finalize:{session_id}"
+
+
+def processing_key(worker_id: str) -> str:
+    return f"judge:processing:{worker_id}"
+
+
+def heartbeat_key(worker_id: str) -> str:
+    return f"judge:heartbeat:{worker_id}"
+
+
+# Проверка длины очереди и добавление задачи должны быть атомарными,
+# иначе при пиковой нагрузке очередь вырастет больше лимита
+_ENQUEUE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[2], 'status', 'queued')
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+redis.call('RPUSH', KEYS[1], ARGV[2])
+return 1
+"""
+_enqueue = redis_client.register_script(_ENQUEUE_SCRIPT)
+
+# Задачи упавшего проверяющего возвращаются в начало очереди в прежнем порядке
+_REQUEUE_WORKER_SCRIPT = """
+local moved = 0
+while redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT') do
+    moved = moved + 1
+end
+redis.call('SREM', KEYS[3], ARGV[1])
+return moved
+"""
+_requeue_worker = redis_client.register_script(_REQUEUE_WORKER_SCRIPT)
+
+# Отметка о финализации и сама задача ставятся вместе: иначе после сбоя между ними
+# отметка не дала бы поставить задачу повторно
+_ENQUEUE_FINALIZE_SCRIPT = """
+if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+return 1
+"""
+_enqueue_finalize = redis_client.register_script(_ENQUEUE_FINALIZE_SCRIPT)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class JudgeQueue:
+    @staticmethod
+    async def enqueue(user_id: int, session_id: int, task_id: int, code: str, language: str = "python") -> str:
+        """Ставит решение в очередь на проверку и возвращает id посылки"""
+        submission_id = uuid.uuid4().hex
+        job = json.dumps({
+            "type": "submission",
+            "submission_id": submission_id,
+            "user_id": user_id,
+            "session_id": session_id,
+            "task_id": task_id,
+            "code": code,
+            "language": language,
+            "enqueued_at": time.time(),
+        })
+        added = await _enqueue(keys=[QUEUE_KEY, submission_key(submission_id), pending_key(session_id)],
+                               args=[settings.JUDGE_MAX_QUEUE, job, settings.JUDGE_RESULT_TTL])
+        if not added:
+            raise QueueFull()
+        return submission_id
+
+    @staticmethod
+    async def job_finished(session_id: int):
+        await redis_client.decr(pending_key(session_id))
+
+    @staticmethod
+    async def pending_count(session_id: int) -> int:
+        return int(await redis_client.get(pending_key(session_id)) or 0)
+
+    @staticmethod
+    async def enqueue_finalize(session_id: int) -> bool:
+        """Ставит финализацию сессии в конец очереди - после всех уже отправленных решений.
+
+        Повторные вызовы для той же сессии (другие воркеры, рестарт) схлопываются в одну задачу
+        """
+        job = json.dumps({"type": "finalize", "session_id": session_id, "enqueued_at": time.time()})
+        return bool(await _enqueue_finalize(keys=[finalize_key(session_id), QUEUE_KEY],
+                                            args=[job, settings.FINALIZE_WAIT_TIMEOUT]))
+
+    @staticmethod
+    async def requeue(job: dict):
+        # служебные задачи не ограничиваются JUDGE_MAX_QUEUE
+        await redis_client.rpush(QUEUE_KEY, json.dumps(job))
+
+    @staticmethod
+    async def get_result(submission_id: str) -> dict | None:
+        data = await redis_client.hgetall(submission_key(submission_id))
+        if not data:
+            return None
+        result = {"status": data["status"]}
+        if "error" in data:
+            result["error"] = data["error"]
+        if "results" in data:
+            result["test_passed"] = int(data["test_passed"])
+            result["results"] = json.loads(data["results"])
+        return result
+
+    @staticmethod
+    async def set_running(submission_id: str):
+        await redis_client.hset(submission_key(submission_id), "status", "running")
+
+    @staticmethod
+    async def set_done(submission_id: str, results: list[dict], test_passed: int, latency: float | None = None,
+                       delivery: tuple[str, str] | None = None):
+        """delivery - (worker_id, raw) из pop: задача снимается из списка в работе вместе с записью результата"""
+        key = submission_key(submission_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"status": "done", "results": json.dumps(results), "test_passed": test_passed})
+            pipe.expire(key, settings.JUDGE_RESULT_TTL)
+            if latency is not None:
+                pipe.lpush(LATENCY_KEY, latency)
+                pipe.ltrim(LATENCY_KEY, 0, LATENCY_SAMPLES - 1)
+            if delivery is not None:
+                pipe.lrem(processing_key(delivery[0]), 1, delivery[1])
+            await pipe.execute()
+
+    @staticmethod
+    async def create_done(results: list[dict], test_passed: int) -> str:
+        """Создает уже проверенную посылку в обход очереди (ответ из кэша)"""
+        submission_id = uuid.uuid4().hex
+        await JudgeQueue.set_done(submission_id, results=results, test_passed=test_passed)
+        return submission_id
+
+    @staticmethod
+    async def set_failed(submission_id: str, error: str, delivery: tuple[str, str] | None = None):
+        key = submission_key(submission_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"status": "failed", "error": error})
+            pipe.expire(key, settings.JUDGE_RESULT_TTL)
+            if delivery is not None:
+                pipe.lrem(processing_key(delivery[0]), 1, delivery[1])
+            await pipe.execute()
+
+    @staticmethod
+    async def pop(worker_id: str, timeout: int = 5) -> tuple[dict, str] | None:
+        """(задача, ее исходная строка): задача переносится в список проверяющего и лежит там до ack,
+        set_done или set_failed - если проверяющий упадет, requeue_stale вернет ее в очередь
+        """
+        raw = await redis_client.blmove(QUEUE_KEY, processing_key(worker_id), timeout, "LEFT", "RIGHT")
+        if raw is None:
+            return None
+        return json.loads(raw), raw
+
+    @staticmethod
+    async def ack(worker_id: str, raw: str):
+        await redis_client.lrem(processing_key(worker_id), 1, raw)
+
+    @staticmethod
+    async def heartbeat(worker_id: str):
+        """Проверяющий жив: без продления за JUDGE_WORKER_TTL его задачи вернутся в очередь"""
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(heartbeat_key(worker_id), 1, ex=settings.JUDGE_WORKER_TTL)
+            pipe.sadd(WORKERS_KEY, worker_id)
+            await pipe.execute()
+
+    @staticmethod
+    async def requeue_worker(worker_id: str) -> int:
+        """Возвращает в начало очереди все задачи проверяющего и забывает его"""
+        await redis_client.delete(heartbeat_key(worker_id))
+        return await _requeue_worker(keys=[processing_key(worker_id), QUEUE_KEY, WORKERS_KEY], args=[worker_id])
+
+    @staticmethod
+    async def requeue_stale() -> int:
+        """Задачи проверяющих, переставших продлевать heartbeat (упали или убиты), - обратно в очередь"""
+        moved = 0
+        for worker_id in await redis_client.smembers(WORKERS_KEY):
+            if not await redis_client.exists(heartbeat_key(worker_id)):
+                moved += await _requeue_worker(keys=[processing_key(worker_id), QUEUE_KEY, WORKERS_KEY],
+                                               args=[worker_id])
+        return moved
+
+    @staticmethod
+    async def stats() -> dict:
+        depth = await redis_client.llen(QUEUE_KEY)
+        samples = [float(sample) for sample in await redis_client.lrange(LATENCY_KEY, 0, -1)]
+        return {
+            "queue_depth": depth,
+            "max_queue_depth": settings.JUDGE_MAX_QUEUE,
+            "latency_p50": _percentile(samples, 0.50),
+            "latency_p95": _percentile(samples, 0.95),
+            "latency_p99": _percentile(samples, 0.99),
+        }
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+
+from backend.docker_lib_nekit.docker_sandbox import sandbox
+from src.config import settings
+from src.db_action.queries import Users
+from .batch import judge_batch
+from .cache import JudgeCache
+from .queue import JudgeQueue
+from src.leaderboard import publish_session_event
+from src.metrics import SANDBOX_DURATION, process_name, publish_loop
+
+
+logger = logging.getLogger(__name__)
+
+
+def language_images() -> list:
+    """Классы образов, нужные включенным языкам (без повторов, в порядке JUDGE_LANGUAGES)"""
+    images = {}
+    for language in settings.JUDGE_LANGUAGES:
+        image = sandbox.get_runner(language).image
+        images[image.get_dockerfile_path()] = image
+    return list(images.values())
+
+
+def make_pools(tags: dict[str, str]) -> dict[str, sandbox.ContainerPool]:
+    """Пул контейнеров на каждый образ: dockerfile -> пул"""
+    pools = {}
+    for image_class in language_images():
+        dockerfile = image_class.get_dockerfile_path()
+        image = sandbox.Image(image=image_class, tag=tags[dockerfile], build_logs=iter(()))
+        pools[dockerfile] = sandbox.ContainerPool(image, size=settings.JUDGE_POOL_SIZE,
+                                                  max_overflow=settings.JUDGE_POOL_MAX_OVERFLOW,
+                                                  mem=settings.JUDGE_MEM_LIMIT, nano_cpus=settings.JUDGE_NANO_CPUS)
+    return pools
+
+
+def _judge(pools: dict[str, sandbox.ContainerPool], language: str, code: str, tests: list,
+           time_limit: float, memory_limit: int):
+    runner = sandbox.get_runner(language)
+    started = time.perf_counter()
+    with pools[runner.image.get_dockerfile_path()].checkout() as container:
+        SANDBOX_DURATION.observe(time.perf_counter() - started, language, "checkout")
+        with SANDBOX_DURATION.time(language, "judge"):
+            return judge_batch(container, runner, code=code, tests=tests, time_limit=time_limit, memory_limit=memory_limit)
+
+
+async def process_job(job: dict, pools: dict[str, sandbox.ContainerPool], aio: sandbox.AsyncSandbox,
+                      delivery: tuple[str, str] | None = None):
+    await JudgeQueue.set_running(job["submission_id"])
+    language = job.get("language", "python")
+    cache_key = await JudgeCache.make_key(code=job["code"], task_id=job["task_id"], language=language)
+    cached = await JudgeCache.get(cache_key) if cache_key else None
+    if cached:
+        results, test_passed = cached["results"], cached["test_passed"]
+    else:
+        tests = await Users.get_tests_for_task(task_id=job["task_id"])
+        time_limit, memory_limit = await Users.get_task_limits(task_id=job["task_id"])
+        # docker SDK синхронный - уводим проверку в пул песочницы, чтобы не блокировать цикл событий
+        judged = await aio.call(_judge, pools, language, job["code"], tests, time_limit, memory_limit)
+        results = [result.model_dump() for result in judged]
+        test_passed = sum(result.passed for result in judged)
+        cpu_time = sum(result.cpu_time for result in judged)
+        if cpu_time > settings.JUDGE_HEAVY_CPU_SECONDS:
+            logger.warning("heavy submission %s: task %s, user %s, cpu %.1fs, max rss %d KB", job["submission_id"],
+                           job["task_id"], job["user_id"], cpu_time, max(result.max_rss for result in judged))
+        # сбой песочницы не кэшируем, иначе он отдавался бы как вердикт до истечения JUDGE_CACHE_TTL
+        if cache_key and not any(result.runner_failed for result in judged):
+            await JudgeCache.set(cache_key, results=results, test_passed=test_passed)
+    await Users.update_test_passed(user_id=job["user_id"], test_passed=test_passed)
+    await Users.record_submission(submission_uid=job["submission_id"], user_id=job["user_id"],
+                                  session_id=job["session_id"], task_id=job["task_id"], language=language,
+                                  submitted_at=job["enqueued_at"], results=results)
+    await JudgeQueue.set_done(job["submission_id"], results=results, test_passed=test_passed,
+                              latency=time.time() - job["enqueued_at"], delivery=delivery)
+
+
+async def finalize_session(job: dict):
+    """Итог сессии после дедлайна: ждем, пока проверятся все отправленные до него решения.
+
+    Пока решения сессии еще в очереди, задача возвращается в ее конец,
+    а не держит воркер в ожидании
+    """
+    session_id = job["session_id"]
+    timed_out = time.time() - job["enqueued_at"] > settings.FINALIZE_WAIT_TIMEOUT
+    if await JudgeQueue.pending_count(session_id) > 0 and not timed_out:
+        await asyncio.sleep(0.5)
+        await JudgeQueue.requeue(job)
+        return
+    await publish_session_event(session_id, {"type": "finished"})
+
+
+async def keep_alive(worker_id: str):
+    """Продлевает heartbeat проверяющего и возвращает в очередь задачи упавших проверяющих"""
+    while True:
+        try:
+            await JudgeQueue.heartbeat(worker_id)
+            moved = await JudgeQueue.requeue_stale()
+            if moved:
+                logger.warning("requeued %d jobs of stopped judge workers", moved)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("judge heartbeat: %s", e)
+        await asyncio.sleep(settings.JUDGE_WORKER_TTL / 3)
+
+
+async def run_jobs(pools: dict[str, sandbox.ContainerPool], aio: sandbox.AsyncSandbox):
+    """Бесконечно разбирает очередь проверки (отдельно от пулов - бенчмарк подставляет свои).
+
+    Взятая задача лежит в списке этого проверяющего, пока не записан ее результат:
+    если процесс упадет посреди проверки, задачу вернет в очередь другой проверяющий
+    """
+    worker_id = f"{process_name('judge')}:{uuid.uuid4().hex[:8]}"
+    await JudgeQueue.heartbeat(worker_id)
+    alive = asyncio.create_task(keep_alive(worker_id))
+    try:
+        while True:
+            popped = await JudgeQueue.pop(worker_id)
+            if popped is None:
+                continue
+            job, raw = popped
+            delivery = (worker_id, raw)
+            if job.get("type") == "finalize":
+                await finalize_session(job)
+                await JudgeQueue.ack(*delivery)
+                continue
+            try:
+                await process_job(job, pools, aio, delivery)
+            except Exception:
+                logger.exception("judging submission %s failed", job["submission_id"])
+                await JudgeQueue.set_failed(job["submission_id"], error="Ошибка при проверке решения",
+                                            delivery=delivery)
+            # не в finally: прерванная задача вернется в очередь и будет учтена при повторной проверке
+            await JudgeQueue.job_finished(job["session_id"])
+    finally:
+        alive.cancel()
+        # задача, прерванная остановкой, сразу достается другим, а не через JUDGE_WORKER_TTL
+        await JudgeQueue.requeue_worker(worker_id)
+
+
+async def worker_loop(tags: dict[str, str]):
+    # вердикты кэшируются в пределах набора образов: сменился любой - старые ключи не совпадут
+    await JudgeCache.set_image_tag("|".join(sorted(tags.values())))
+    sandbox.configure(timeout=settings.DOCKER_TIMEOUT, max_pool_size=settings.DOCKER_MAX_POOL_SIZE)
+    aio = sandbox.AsyncSandbox(max_workers=settings.SANDBOX_THREADS)
+    pools = make_pools(tags)
+    for pool in pools.values():
+        await aio.call(pool.start)
+    metrics_publisher = asyncio.create_task(publish_loop("judge"))
+    try:
+        await run_jobs(pools, aio)
+    finally:
+        metrics_publisher.cancel()
+        for pool in pools.values():
+            await aio.call(pool.shutdown)
+        aio.shutdown()
+
+
+def worker_main(tags: dict[str, str]):
+    asyncio.run(worker_loop(tags))
+
+
+def prepare_images() -> dict[str, str]:
+    """Готовые образы включенных языков (собираются, если содержимое изменилось): dockerfile -> тег"""
+    tags = {}
+    for image_class in language_images():
+        image = sandbox.build(image_class)
+        sandbox.remove_stale_images(image_class, keep_tag=image.tag)
+        tags[image_class.get_dockerfile_path()] = image.tag
+    return tags
+
+
+def main(workers: int | None = None):
+    """Берет готовые образы включенных языков и запускает пул процессов-проверяющих.
+
+    Образы лучше подготовить заранее: python -m backend.docker_lib_nekit.docker_sandbox.sandbox warmup python ubuntu
+    """
+    tags = prepare_images()
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(tags,), name=f"judge-worker-{i}")
+        for i in range(workers or settings.JUDGE_WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import logging
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from redis.exceptions import RedisError
+
+from src.redis_client import redis_client
+
+
+CHANNEL_PREFIX = "leaderboard:"
+SUBSCRIBER_QUEUE_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+async def publish_score(session_id: int, user_id: int, name: str, test_passed: int):
+    """Рассылает новый результат ученика всем процессам API через Redis pub/sub"""
+    message = json.dumps({"user_id": user_id, "name": name, "test_passed": test_passed})
+    await redis_client.publish(f"{CHANNEL_PREFIX}{session_id}", message)
+
+
+async def publish_session_event(session_id: int, event: dict):
+    """Событие сессии целиком (например, {"type": "finished"}) для всех подписчиков"""
+    await redis_client.publish(f"{CHANNEL_PREFIX}{session_id}", json.dumps(event))
+
+
+class SessionBoard:
+    def __init__(self):
+        self.scores: dict[int, dict] = {}
+        self.subscribers: set[asyncio.Queue] = set()
+        self.loaded = asyncio.Event()
+
+    def snapshot(self) -> dict:
+        scores = sorted(self.scores.values(), key=lambda score: -score["test_passed"])
+        return {"type": "snapshot", "scores": scores}
+
+
+class LeaderboardHub:
+    """Таблицы результатов активных сессий в памяти процесса.
+
+    Доска существует, пока на нее кто-то подписан. Изменения приходят из
+    Redis pub/sub и применяются инкрементально, каждому подписчику уходит
+    только дельта. Очередь подписчика ограничена: если клиент не успевает
+    читать, его очередь сбрасывается и заменяется свежим снимком
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.boards: dict[int, SessionBoard] = {}
+
+    async def subscribe(self, session_id: int) -> asyncio.Queue:
+        from src.db_action.queries import Users
+        board = self.boards.get(session_id)
+        if board is None:
+            board = self.boards[session_id] = SessionBoard()
+            try:
+                for score in await Users.get_session_scores(session_id=session_id):
+                    # дельты, пришедшие во время загрузки, новее данных из БД
+                    board.scores.setdefault(score["user_id"], score)
+            finally:
+                board.loaded.set()
+        else:
+            await board.loaded.wait()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(board.snapshot())
+        board.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: int, queue: asyncio.Queue):
+        board = self.boards.get(session_id)
+        if board is None:
+            return
+        board.subscribers.discard(queue)
+        if not board.subscribers:
+            del self.boards[session_id]
+
+    def apply(self, session_id: int, message: dict):
+        board = self.boards.get(session_id)
+        if board is None:
+            return
+        if "type" in message:
+            delta = message
+        else:
+            board.scores[message["user_id"]] = message
+            delta = {"type": "delta", **message}
+        for queue in board.subscribers:
+            try:
+                queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(board.snapshot())
+
+    async def run(self):
+        """Слушает Redis и применяет изменения, запускается из lifespan приложения"""
+        while True:
+            try:
+                async with redis_client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        session_id = int(message["channel"].removeprefix(CHANNEL_PREFIX))
+                        self.apply(session_id, json.loads(message["data"]))
+            except RedisError as e:
+                logger.warning("leaderboard listener: %s", e)
+                await asyncio.sleep(1)
+
+
+leaderboard_hub = LeaderboardHub()
+
+
+async def stream_leaderboard(websocket: WebSocket, session_id: int):
+    await websocket.accept()
+    queue = await leaderboard_hub.subscribe(session_id)
+
+    async def send_updates():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(send_updates())
+    try:
+        # клиент ничего не присылает, читаем только чтобы сразу заметить отключение
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        leaderboard_hub.unsubscribe(session_id, queue)
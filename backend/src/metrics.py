@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+
+from src.config import settings
+from src.redis_client import redis_client
+
+
+# границы корзин гистограмм длительности, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# снимки метрик процессов-проверяющих: поле - процесс, значение - {"ts": ..., "metrics": ...}
+SNAPSHOTS_KEY = "metrics:snapshots"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: tuple = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # метрики пишутся и из цикла событий, и из пулов потоков (bcrypt, docker)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        (registry or REGISTRY).register(self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = [[list(labels), value.copy() if isinstance(value, list) else value]
+                      for labels, value in self._values.items()]
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames), "values": values}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Значение на набор меток - [число попаданий в каждую корзину..., в +Inf, сумма]"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, *labels) -> "Timer":
+        return Timer(self, labels)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+
+class Timer:
+    """with histogram.time("label"): ... - длительность блока в секундах"""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def timed(histogram: Histogram, *labels):
+    """Декоратор: длительность вызова обычной или async функции"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels)
+        return wrapper
+    return decorator
+
+
+def instrument_static_methods(cls, histogram: Histogram):
+    """Оборачивает async-методы класса со @staticmethod таймером с меткой = имя метода"""
+    for name, attribute in list(vars(cls).items()):
+        if isinstance(attribute, staticmethod) and inspect.iscoroutinefunction(attribute.__func__):
+            setattr(cls, name, staticmethod(timed(histogram, name)(attribute.__func__)))
+    return cls
+
+
+def _add_process(into: dict, process: str, snapshot: dict):
+    """Ряды снимка процесса с дополнительной меткой process.
+
+    Ряды процессов не суммируются: когда снимок остановленного процесса устаревает,
+    сумма счетчика уменьшилась бы, а Prometheus принял бы это за сброс
+    """
+    for name, family in snapshot.items():
+        labelnames = [*family["labelnames"], "process"]
+        target = into.setdefault(name, {**family, "labelnames": labelnames, "values": []})
+        if (target["kind"], target.get("buckets"), target["labelnames"]) != \
+                (family["kind"], family.get("buckets"), labelnames):
+            continue  # другая версия кода с несовместимой метрикой
+        target["values"].extend([[*labels, process], value] for labels, value in family["values"])
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self.metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def render(self, process: str | None = None, snapshots: dict[str, dict] | None = None) -> str:
+        """Текстовый формат Prometheus.
+
+        Без process - только метрики этого процесса. С process - метрики этого процесса и снимки
+        других ({процесс: снимок}), у каждого ряда метка process
+        """
+        if process is None:
+            families = self.snapshot()
+        else:
+            families = {}
+            for name, snapshot in {process: self.snapshot(), **(snapshots or {})}.items():
+                _add_process(families, name, snapshot)
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            names = family["labelnames"]
+            for labels, value in family["values"]:
+                if family["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip([*family["buckets"], math.inf], value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names, labels, (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP-запросы по маршруту и коду ответа",
+                        ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Время обработки HTTP-запроса",
+                          ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP-запросы в обработке")
+DB_CALL_DURATION = Histogram("db_call_duration_seconds", "Время вызовов Users.*", ("method",))
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Ожидание свободного соединения в пуле БД")
+PASSWORD_HASH_DURATION = Histogram("password_hash_duration_seconds", "Время bcrypt", ("operation",),
+                                   buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+JWT_DURATION = Histogram("jwt_duration_seconds", "Время подписи и проверки JWT", ("operation",),
+                         buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+SANDBOX_DURATION = Histogram("sandbox_duration_seconds", "Ожидание контейнера и проверка в песочнице",
+                             ("language", "stage"), buckets=(*DEFAULT_BUCKETS, 30.0, 60.0))
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка, коды ответа и число запросов в обработке.
+
+    Маршрут берется из шаблона пути (/teachers/upload_tests/{task_id}), а не из самого пути,
+    чтобы число рядов метрик не росло с числом id
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_DURATION.observe(elapsed, scope["method"], path)
+            HTTP_REQUESTS.inc(scope["method"], path, str(status_code))
+
+
+def process_name(role: str) -> str:
+    return f"{role}:{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_snapshot(name: str):
+    await redis_client.hset(SNAPSHOTS_KEY, name, json.dumps({"ts": time.time(), "metrics": REGISTRY.snapshot()}))
+
+
+async def collect_snapshots(exclude: str | None = None) -> dict[str, dict]:
+    """Свежие снимки других процессов по имени процесса; снимки остановленных процессов удаляются"""
+    snapshots, stale = {}, []
+    for name, raw in (await redis_client.hgetall(SNAPSHOTS_KEY)).items():
+        if name == exclude:
+            continue
+        entry = json.loads(raw)
+        if time.time() - entry["ts"] > settings.METRICS_PUBLISH_INTERVAL * 3:
+            stale.append(name)
+        else:
+            snapshots[name] = entry["metrics"]
+    if stale:
+        await redis_client.hdel(SNAPSHOTS_KEY, *stale)
+    return snapshots
+
+
+async def publish_loop(role: str):
+    """Процесс периодически выкладывает свои метрики в Redis: /metrics отвечает один процесс API,
+    а показывать нужно ряды всех процессов API и проверяющих
+    """
+    name = process_name(role)
+    while True:
+        try:
+            await publish_snapshot(name)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("metrics snapshot not published: %s", e)
+        await asyncio.sleep(settings.METRICS_PUBLISH_INTERVAL)
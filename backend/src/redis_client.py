@@ -0,0 +1,10 @@
+from redis import asyncio as aioredis
+
+from src.config import settings
+
+
+# обычный пул при нехватке соединений сразу падает с MaxConnectionsError - на волне подключений учеников
+# лучше подождать освободившееся
+redis_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL, decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS, timeout=settings.REDIS_POOL_TIMEOUT))
@@ -0,0 +1,51 @@
+import csv
+import datetime
+import io
+import json
+from collections.abc import AsyncIterator
+
+
+# примерный размер куска ответа при выгрузке
+EXPORT_CHUNK_BYTES = 64 * 1024
+RANKING_COLUMNS = ("place", "user_id", "name", "test_passed", "tests_total", "verdict", "attempts",
+                   "best_submitted_at")
+
+
+def _cell(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def jsonable_row(row: dict) -> dict:
+    return {key: _cell(value) for key, value in row.items()}
+
+
+async def iter_csv(rows: AsyncIterator[dict], columns: tuple[str, ...] = RANKING_COLUMNS) -> AsyncIterator[bytes]:
+    """CSV с заголовком; в памяти держится только текущий кусок, а не вся выгрузка"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([_cell(row.get(column)) for column in columns])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def iter_jsonl(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """JSONL - один объект на строку, отдается кусками примерно по EXPORT_CHUNK_BYTES"""
+    chunk = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(jsonable_row(row), ensure_ascii=False) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk).encode()
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode()
@@ -0,0 +1,29 @@
+import logging
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from src.metrics import CONTENT_TYPE, REGISTRY, collect_snapshots, process_name
+
+
+logger = logging.getLogger(__name__)
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики всех процессов (API и проверяющих) в текстовом формате Prometheus.
+
+    Ряды каждого процесса отдаются отдельно с меткой process, суммировать - в запросах Prometheus
+    (sum without (process) ...). Этот процесс отдает свои метрики напрямую, а не из своего снимка в Redis
+    """
+    name = process_name("api")
+    try:
+        snapshots = await collect_snapshots(exclude=name)
+    except Exception as e:
+        # без Redis отдаем хотя бы свои метрики
+        logger.warning("metrics snapshots unavailable: %s", e)
+        snapshots = {}
+    return Response(content=REGISTRY.render(name, snapshots), media_type=CONTENT_TYPE)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from src.database import pool_stats
+from src.judge.cache import JudgeCache
+from src.judge.queue import JudgeQueue
+
+
+service_router = APIRouter(prefix="/service")
+
+
+@service_router.get("/judge_stats")
+async def judge_stats():
+    stats = await JudgeQueue.stats()
+    stats.update(await JudgeCache.stats())
+    return stats
+
+
+@service_router.get("/db_pool")
+async def db_pool():
+    return pool_stats()
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import APIRouter, Form, HTTPException, Depends, Query, Request, WebSocket, status
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from typing import Annotated
+from typing import Annotated, Literal
 import datetime
 
 from src.db_action.models import IsStarted
 from src.schemas.router_db import TeacherRegister, JWTSchema
 from src.schemas.incoming import Tests, TaskCreation
+from src.database import get_session
 from src.db_action.queries import Users
-from backend.src.utils import PasswordActions, JWTActions, AuthActions
+from src.upload_tests import ImportReport, LineTooLong, iter_lines, iter_tests
+from src.leaderboard import stream_leaderboard
+from src.results_export import iter_csv, iter_jsonl, jsonable_row
+from src.utils import PasswordActions, JWTActions, AuthActions
 
 
-teacher_router = APIRouter(prefix="/teachers")
+teacher_router = APIRouter(prefix="/teachers", dependencies=[Depends(get_session)])
+# WebSocket живет долго - ему не нужна сессия БД на все время соединения
+teacher_ws_router = APIRouter(prefix="/teachers")
 not_authorized = HTTPException(status_code=401, detail="Пользователь не авторизован")
 
 
@@ -37,7 +43,10 @@ async def teacher_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends(
     password = form_data.password
     password_hash = await Users.check_teacher_uniqueness_and_return_password(email)
     if password_hash:
-        if PasswordActions.validate(password=password, hashed_password=password_hash):
+        if await PasswordActions.validate_async(password=password, hashed_password=password_hash):
+            # стоимость bcrypt поменялась в настройках - пересчитываем хеш, пока знаем пароль
+            if PasswordActions.needs_rehash(password_hash):
+                await Users.update_teacher_password_hash(email, await PasswordActions.hash_async(password))
             payload  = {"sub": email}
             token = JWTActions.encode(payload=payload)
             return JWTSchema(access_token=token, token_type="Bearer")
@@ -48,10 +57,16 @@ async def teacher_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends(
     
 
 @teacher_router.get("/teacher_mainpage")
-async def teacher_mainpage(token: Annotated[str, Depends(AuthActions.oauth2_scheme)]):
-    if await AuthActions.validate_user(token=token):
-        list_of_tasks = await Users.list_of_tasks()
-        return list_of_tasks
+async def teacher_mainpage(token: Annotated[str, Depends(AuthActions.oauth2_scheme)],
+                           limit: Annotated[int, Query(ge=1, le=100)] = 20,
+                           cursor: str | None = None,
+                           title: str | None = None):
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
+        try:
+            return await Users.list_of_tasks(teacher_id=teacher_info.id, limit=limit, cursor=cursor, title_prefix=title)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
     return not_authorized
 
 
@@ -59,31 +74,73 @@ async def teacher_mainpage(token: Annotated[str, Depends(AuthActions.oauth2_sche
 async def create_task(token: Annotated[str, Depends(AuthActions.oauth2_scheme)],
                       title: Annotated[str, Form()],
                       text: Annotated[str, Form()],
-                      list_of_tasks: list = Annotated[Tests, Form()],
+                      list_of_tasks: Annotated[list[Tests] | None, Form()] = None,
+                      time_limit: Annotated[float | None, Form()] = None,
+                      memory_limit: Annotated[int | None, Form()] = None,
                       ):
-    if await AuthActions.validate_user(token=token):
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         #проверяем валидность ввода текста для задания
         try:
-            TaskCreation(title=title, task_text=text)
+            TaskCreation(title=title, text=text, time_limit=time_limit, memory_limit=memory_limit)
         except:
             raise HTTPException(status_code=400, detail="Неккоректный ввод")
 
-        teacher_info = await Users.get_teacher_info_by_email(token=token)
         #вносим в бд новое задание + тесты к нему в таблицу tests
         try:
-            task_id = await Users.create_task_return_task_id(title=title, task_text=text, teacher_id=teacher_info.id)
-            await Users.add_tests_to_task(list_of_tests=list_of_tasks, task_id=task_id)
+            task_id = await Users.create_task_return_task_id(title=title, task_text=text, teacher_id=teacher_info.id,
+                                                             time_limit=time_limit, memory_limit=memory_limit)
+            if list_of_tasks:
+                await Users.add_tests_to_task(list_of_tests=list_of_tasks, task_id=task_id)
             return JSONResponse(content={"message": "Задание успешно создано"})
         except:
             raise HTTPException(status_code=400, detail="Неккоректный ввод")
     return not_authorized
 
 
+@teacher_router.post("/upload_tests/{task_id}")
+async def upload_tests(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], task_id: int, request: Request,
+                       format: Literal["jsonl", "csv"] = "jsonl"):
+    """Тело запроса - JSONL ({"input": ..., "output": ...} на строку) или CSV (input,output), читается потоком"""
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
+        owner_id = await Users.get_task_owner(task_id=task_id)
+        if owner_id is None:
+            raise HTTPException(status_code=404, detail="Задания не существует")
+        if owner_id != teacher_info.id:
+            raise HTTPException(status_code=403, detail="Задание создано не вами")
+        report = ImportReport()
+        tests = iter_tests(iter_lines(request.stream()), fmt=format, report=report)
+        try:
+            report.inserted = await Users.import_tests(task_id=task_id, tests=tests)
+        except LineTooLong:
+            # уже вставленные пачки остаются в БД
+            raise HTTPException(status_code=413, detail="Строка длиннее 64 КБ, загрузка прервана")
+        return JSONResponse(status_code=200, content=report.as_dict())
+    return not_authorized
+
+
 @teacher_router.get("/view_task_info")
 async def view_task_info(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], task_id: int):
     if await AuthActions.validate_user(token=token):
-        task_info = await Users.view_task_info(task_id=task_id)
-        return JSONResponse(status_code=200, content=task_info)
+        task_info = await Users.view_task_info_json(task_id=task_id)
+        if task_info is None:
+            raise HTTPException(status_code=404, detail="Задания не существует")
+        return Response(status_code=200, content=task_info, media_type="application/json")
+    return not_authorized
+
+
+@teacher_router.get("/task_analytics")
+async def task_analytics(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], task_id: int):
+    """Проваливаемые тесты, медианное время и динамика по всем сессиям задания"""
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
+        owner_id = await Users.get_task_owner(task_id=task_id)
+        if owner_id is None:
+            raise HTTPException(status_code=404, detail="Задания не существует")
+        if owner_id != teacher_info.id:
+            raise HTTPException(status_code=403, detail="Задание создано не вами")
+        return JSONResponse(status_code=200, content=await Users.get_task_analytics(task_id=task_id))
     return not_authorized
 
 
@@ -115,10 +172,10 @@ async def update_task(token: Annotated[str, Depends(AuthActions.oauth2_scheme)],
 
 @teacher_router.post("/leave_comment")
 async def view_tasks(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], task_id: int, comment: Annotated[str, Form()]):
-    if await AuthActions.validate_user(token=token):
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         try:
-            teacher_id = await Users.get_teacher_info_by_email(token=token)
-            await Users.leave_comment(teacher_id=teacher_id.id, task_id=task_id, comment=comment)
+            await Users.leave_comment(teacher_id=teacher_info.id, task_id=task_id, comment=comment)
         except:
             raise HTTPException(status_code=500, detail="Что-то пошло не так")    
         return JSONResponse(status_code=200, content={"message": "Комментарии успешно отправлены"})
@@ -127,21 +184,22 @@ async def view_tasks(token: Annotated[str, Depends(AuthActions.oauth2_scheme)],
 
 @teacher_router.post("/create_session")
 async def create_session(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], task_id: int, deadline_time: Annotated[datetime.datetime, Form()]):
-    if await AuthActions.validate_user(token=token):
-        teacher_id = await Users.get_teacher_info_by_email(token=token).id
-        probable_unique_code = await Users.look_for_teacher_session(teacher_id=teacher_id)
-        if await probable_unique_code:
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
+        teacher_id = teacher_info.id
+        probable_unique_code = await Users.look_for_teacher_session_and_return_unique_code(teacher_id=teacher_id)
+        if probable_unique_code:
             raise HTTPException(status_code=400,
                                 detail=f"У вас уже есть активная сессия доступная по ссылке http://127.0.0.1:8000/teacher/session_preview{probable_unique_code}")
-        await Users.create_session(teacher_id=teacher_id, task_id=task_id, deadline_time=deadline_time)
-        return JSONResponse(status_code=200, content={"message": "Сессия успешно создана"})
+        unique_code = await Users.create_session(teacher_id=teacher_id, task_id=task_id, deadline_time=deadline_time)
+        return JSONResponse(status_code=200, content={"message": "Сессия успешно создана", "unique_code": unique_code})
     return not_authorized
 
 
 @teacher_router.get("/session_preview/{unique_code}")
 async def view_session_info(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], session_id: int):
-    if await AuthActions.validate_user(token=token):
-        teacher_info = await Users.get_teacher_info_by_email(token=token)
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         teachers_session = await Users.look_for_teacher_session_and_return_unique_code(teacher_id=teacher_info.id)
         session_info = await Users.view_session_info(session_id=session_id)
         if session_info.unique_code == teachers_session:
@@ -152,11 +210,11 @@ async def view_session_info(token: Annotated[str, Depends(AuthActions.oauth2_sch
 
 @teacher_router.post("/session_preview/{unique_code}")
 async def start_session(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], session_id: int):
-    if await AuthActions.validate_user(token=token):
-        teacher_info = await Users.get_teacher_info_by_email(token=token)
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         teachers_session = await Users.look_for_teacher_session_and_return_unique_code(teacher_id=teacher_info.id)
         session_info = await Users.view_session_info(session_id=session_id)
-        if session_info.unique_code == teachers_session:
+        if session_info is not None and session_info.unique_code == teachers_session:
             await Users.session_change_status(session_id=session_id, status=IsStarted.started)
             return RedirectResponse(url=f"http://127.0.0.1:8000/teacher/started_session_info/{teachers_session}")
         return HTTPException(status_code=403, detail="Сессия создана не вами")
@@ -165,8 +223,8 @@ async def start_session(token: Annotated[str, Depends(AuthActions.oauth2_scheme)
 
 @teacher_router.get("/started_session_info/{unique_code}")
 async def view_session_info(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], unique_code: str):
-    if await AuthActions.validate_user(token=token):
-        teacher_info = await Users.get_teacher_info_by_email(token=token)
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         if await Users.look_for_teacher_session_and_return_unique_code(teacher_id=teacher_info.id) == unique_code:
             session_overview = Users.get_session_info_by_unique_code(unique_code=unique_code)
             return JSONResponse(status_code=200, content=session_overview)
@@ -174,10 +232,25 @@ async def view_session_info(token: Annotated[str, Depends(AuthActions.oauth2_sch
     return not_authorized
 
 
+@teacher_ws_router.websocket("/ws/session/{unique_code}")
+async def session_leaderboard(websocket: WebSocket, unique_code: str, token: str):
+    """Таблица результатов сессии в реальном времени: снимок, затем дельты"""
+    try:
+        teacher_info = await AuthActions.validate_user(token=token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    session = await Users.get_session_by_code(unique_code=unique_code)
+    if session is None or session.teacher_fk != teacher_info.id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await stream_leaderboard(websocket, session_id=session.id)
+
+
 @teacher_router.post("/end_session/{unique_code}")
 async def end_session(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], unique_code: str):
-    if await AuthActions.validate_user(token=token):
-        teacher_info = await Users.get_teacher_info_by_email(token=token)
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
         if await Users.look_for_teacher_session_and_return_unique_code(teacher_id=teacher_info.id) == unique_code:
             session_overview = Users.get_session_info_by_unique_code(unique_code=unique_code)
             await Users.session_change_status(session_id=session_overview.id, status=IsStarted.finished)
@@ -187,5 +260,26 @@ async def end_session(token: Annotated[str, Depends(AuthActions.oauth2_scheme)],
 
 
 @teacher_router.post("/view_session_results/{unique_code}")
-async def view_session_results(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], unique_code: str):
-    return not_authorized
\ No newline at end of file
+async def view_session_results(token: Annotated[str, Depends(AuthActions.oauth2_scheme)], unique_code: str,
+                               format: Literal["json", "csv", "jsonl"] = "json"):
+    """Рейтинг по лучшим попыткам и статистика по тестам; csv/jsonl - потоковая выгрузка рейтинга"""
+    teacher_info = await AuthActions.validate_user(token=token)
+    if teacher_info:
+        session = await Users.get_session_by_code(unique_code=unique_code)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Сессия не найдена")
+        if session.teacher_fk != teacher_info.id:
+            raise HTTPException(status_code=403, detail="Сессия создана не вами")
+        if format == "json":
+            ranking = await Users.get_session_ranking(session_id=session.id)
+            tests = await Users.get_session_test_stats(session_id=session.id)
+            return JSONResponse(status_code=200, content={"ranking": [jsonable_row(row) for row in ranking],
+                                                          "tests": tests})
+        rows = Users.stream_session_ranking(session_id=session.id)
+        if format == "csv":
+            body, media_type = iter_csv(rows), "text/csv"
+        else:
+            body, media_type = iter_jsonl(rows), "application/x-ndjson"
+        return StreamingResponse(body, media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{unique_code}.{format}"'})
+    return not_authorized
@@ -1,15 +1,37 @@
-from fastapi import APIRouter
+import time
+
+from fastapi import APIRouter, Depends, Form, HTTPException, WebSocket, status
+from fastapi.responses import JSONResponse
 from typing import Annotated
 
-from backend.src.utils import AuthActions
+from src.utils import AuthActions
+from src.config import settings
+from src.database import get_session
+from src.db_action.models import IsStarted
+from src.db_action.queries import Users
+from src.judge.cache import JudgeCache
+from src.judge.queue import JudgeQueue, QueueFull
+from src.leaderboard import stream_leaderboard
+from src.session_index import SessionIndex, join_batcher
 
 
-user_router = APIRouter(prefix="/users")
+user_router = APIRouter(prefix="/users", dependencies=[Depends(get_session)])
+# WebSocket живет долго - ему не нужна сессия БД на все время соединения
+user_ws_router = APIRouter(prefix="/users")
 
 
-@user_router.get("/join_to_session")
-async def join_to_session():
-    ...
+@user_router.post("/join_to_session")
+async def join_to_session(unique_code: Annotated[str, Form()], name: Annotated[str, Form(min_length=1, max_length=30)]):
+    session_info = await SessionIndex.resolve(unique_code=unique_code.upper())
+    if session_info is None:
+        raise HTTPException(status_code=404, detail="Активная сессия с таким кодом не найдена")
+    user_id = await join_batcher.join(session_id=session_info["id"], name=name)
+    # по токену /send_code узнает ученика - user_id из формы мог подставить кто угодно
+    token = AuthActions.issue_participant_token(user_id=user_id, session_id=session_info["id"])
+    return JSONResponse(status_code=200, content={"user_id": user_id, "token": token,
+                                                  "session_id": session_info["id"],
+                                                  "task_id": session_info["task_id"],
+                                                  "deadline_time": session_info["deadline_time"]})
 
 
 @user_router.get("/view_session_info")
@@ -18,11 +40,55 @@ async def view_session_info():
 
 
 
+@user_ws_router.websocket("/ws/session/{unique_code}")
+async def session_leaderboard(websocket: WebSocket, unique_code: str):
+    session = await Users.get_session_by_code(unique_code=unique_code)
+    if session is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await stream_leaderboard(websocket, session_id=session.id)
+
+
 @user_router.post("/send_code")
-async def send_code():
-    ...
+async def send_code(user_id: Annotated[int, Depends(AuthActions.validate_participant)], code: Annotated[str, Form()],
+                    language: Annotated[str, Form()] = "python"):
+    if language not in settings.JUDGE_LANGUAGES:
+        raise HTTPException(status_code=400,
+                            detail=f"Язык не поддерживается, доступны: {', '.join(settings.JUDGE_LANGUAGES)}")
+    participant_session = await Users.get_participant_session(user_id=user_id)
+    if participant_session is None:
+        raise HTTPException(status_code=404, detail="Участник не найден")
+    # проверка общая для кэша вердиктов и очереди: решение принимается только в начатой сессии
+    if participant_session.status == IsStarted.finished:
+        raise HTTPException(status_code=403, detail="Сессия завершена, решения больше не принимаются")
+    if participant_session.status != IsStarted.started:
+        raise HTTPException(status_code=403, detail="Сессия еще не началась")
+    task_id = participant_session.task_fk
+
+    # одинаковые решения (шаблоны, повторные отправки) не гоняем через docker повторно;
+    # в счетчик ожидающих проверки (pending) такая посылка не идет - она записана до ответа
+    cache_key = await JudgeCache.make_key(code=code, task_id=task_id, language=language)
+    cached = await JudgeCache.get(cache_key) if cache_key else None
+    if cached:
+        await Users.update_test_passed(user_id=user_id, test_passed=cached["test_passed"])
+        submission_id = await JudgeQueue.create_done(results=cached["results"], test_passed=cached["test_passed"])
+        await Users.record_submission(submission_uid=submission_id, user_id=user_id, session_id=participant_session.id,
+                                      task_id=task_id, language=language, submitted_at=time.time(),
+                                      results=cached["results"])
+        return JSONResponse(status_code=200, content={"submission_id": submission_id})
+
+    try:
+        submission_id = await JudgeQueue.enqueue(user_id=user_id, session_id=participant_session.id,
+                                                 task_id=task_id, code=code, language=language)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Слишком много решений в очереди, попробуйте позже",
+                            headers={"Retry-After": "5"})
+    return JSONResponse(status_code=202, content={"submission_id": submission_id})
 
 
 @user_router.post("/view_results")
-async def view_results():
-    ...
\ No newline at end of file
+async def view_results(submission_id: str):
+    result = await JudgeQueue.get_result(submission_id=submission_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Посылка не найдена")
+    return JSONResponse(status_code=200, content=result)
@@ -0,0 +1,169 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import os
+import socket
+
+from src.config import settings
+from src.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+# сессии, которые закрываются по дедлайну, пока их финализация не встала в очередь проверки
+FINALIZE_PENDING_KEY = "sessions:finalize_pending"
+
+
+def deadline_lease_key(session_id: int) -> str:
+    return f"sessions:deadline_lease:{session_id}"
+
+
+# аренду снимает только ее владелец: после истечения TTL ее мог взять другой процесс
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lease = redis_client.register_script(_RELEASE_LEASE_SCRIPT)
+
+
+def to_utc_naive(moment: datetime.datetime) -> datetime.datetime:
+    # deadline_time хранится как timestamp без зоны в UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class DeadlineScheduler:
+    """Закрывает сессии по deadline_time и запускает их финализацию.
+
+    Ближайшие дедлайны лежат в min-куче. Отмененные и перенесенные записи не
+    удаляются из кучи, а пропускаются при извлечении (сверка с _deadlines).
+    Каждый процесс API держит свою кучу и периодически перечитывает её из БД,
+    поэтому рестарт ничего не теряет; до одного срабатывания на дедлайн
+    их сводят аренда в Redis и условный UPDATE в finish_session_if_due.
+
+    Сессия попадает в FINALIZE_PENDING_KEY до UPDATE и убирается оттуда после постановки
+    финализации: если между ними упадет Redis или процесс, финализацию доделает reload
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        self._deadlines: dict[int, datetime.datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def schedule(self, session_id: int, deadline_time: datetime.datetime):
+        deadline_time = to_utc_naive(deadline_time)
+        if self._deadlines.get(session_id) == deadline_time:
+            return
+        self._deadlines[session_id] = deadline_time
+        heapq.heappush(self._heap, (deadline_time, session_id))
+        self._wakeup.set()
+
+    def cancel(self, session_id: int):
+        self._deadlines.pop(session_id, None)
+
+    async def reload(self):
+        from src.db_action.queries import Users
+        for session_id, deadline_time in await Users.get_unfinished_session_deadlines():
+            self.schedule(session_id, deadline_time)
+        for session_id in await redis_client.smembers(FINALIZE_PENDING_KEY):
+            await self._recover(int(session_id))
+
+    def _pop_due(self, now: datetime.datetime) -> list[int]:
+        due = []
+        while self._heap:
+            deadline_time, session_id = self._heap[0]
+            if self._deadlines.get(session_id) != deadline_time:
+                heapq.heappop(self._heap)  # устаревшая запись
+                continue
+            if deadline_time > now:
+                break
+            heapq.heappop(self._heap)
+            del self._deadlines[session_id]
+            due.append(session_id)
+        return due
+
+    def _seconds_to_next(self, now: datetime.datetime) -> float:
+        timeout = settings.DEADLINE_RELOAD_INTERVAL
+        if self._heap:
+            timeout = min(timeout, max((self._heap[0][0] - now).total_seconds(), 0))
+        return timeout
+
+    async def _acquire_lease(self, session_id: int) -> bool:
+        return bool(await redis_client.set(deadline_lease_key(session_id), self._owner,
+                                           nx=True, ex=settings.DEADLINE_LEASE_TTL))
+
+    async def _finalize(self, session_id: int):
+        from src.judge.queue import JudgeQueue
+        await JudgeQueue.enqueue_finalize(session_id=session_id)
+        await redis_client.srem(FINALIZE_PENDING_KEY, session_id)
+
+    async def _fire(self, session_id: int):
+        from src.db_action.queries import Users
+        if not await self._acquire_lease(session_id):
+            return
+        finalized = False
+        try:
+            await redis_client.sadd(FINALIZE_PENDING_KEY, session_id)
+            if await Users.finish_session_if_due(session_id=session_id):
+                await self._finalize(session_id)
+                finalized = True
+            else:
+                await redis_client.srem(FINALIZE_PENDING_KEY, session_id)
+        finally:
+            if not finalized:
+                # сессия не закрыта (часы приложения и БД разошлись или ошибка) -
+                # повторная попытка после reload не должна ждать истечения аренды
+                await _release_lease(keys=[deadline_lease_key(session_id)], args=[self._owner])
+
+    async def _recover(self, session_id: int):
+        """Сессия из FINALIZE_PENDING_KEY: ее закрытие прервалось после UPDATE или до него"""
+        from src.db_action.queries import Users
+        from src.db_action.models import IsStarted
+        # аренду держит процесс, который закрывает сессию прямо сейчас
+        if not await self._acquire_lease(session_id):
+            return
+        finalized = False
+        try:
+            if await Users.get_session_status(session_id=session_id) == IsStarted.finished:
+                # индекс сессий мог не обновиться, если сбой был сразу после UPDATE
+                await Users.session_change_status(session_id=session_id, status=IsStarted.finished)
+                await self._finalize(session_id)
+                finalized = True
+            else:
+                # UPDATE не прошел - сессию закроет обычный дедлайн
+                await redis_client.srem(FINALIZE_PENDING_KEY, session_id)
+        finally:
+            if not finalized:
+                await _release_lease(keys=[deadline_lease_key(session_id)], args=[self._owner])
+
+    async def run(self):
+        """Запускается из lifespan приложения"""
+        next_reload = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() >= next_reload:
+                    await self.reload()
+                    next_reload = loop.time() + settings.DEADLINE_RELOAD_INTERVAL
+                now = datetime.datetime.utcnow()
+                for session_id in self._pop_due(now):
+                    await self._fire(session_id)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._seconds_to_next(now))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # БД или Redis недоступны - пробуем снова чуть позже
+                logger.warning("deadline scheduler: %s", e)
+                await asyncio.sleep(1)
+
+
+deadline_scheduler = DeadlineScheduler()
@@ -1,14 +1,20 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
 
 from .incoming import Tests
 
 
 class list_of_tasks(BaseModel):
+    id: int
     title: str
     time_created: str
 
 
+class TasksPage(BaseModel):
+    tasks: List[list_of_tasks]
+    next_cursor: str | None
+
+
 class TeacherInfo(BaseModel):
     id: int
     name: str
@@ -22,6 +28,7 @@ class TaskInfo(BaseModel):
 
 
 class Tests(BaseModel):
+    id: int | None = None
     input: str | int | float | bool
     output: str | int | float | bool
     input_type: str
@@ -61,6 +68,18 @@ class UserOrm(BaseModel):
 
 class UserTestResult(Tests):
     user_output: str | int | float | bool
+    passed: bool = False
+    verdict: str = "RE"
+    checker_message: str | None = None
+    error: str | None = None
+    timed_out: bool = False
+    time: float = 0.0
+    cpu_time: float = 0.0
+    max_rss: int = 0  # КБ
+    exit_code: int = 0
+    oom_killed: bool = False
+    # сбой песочницы, а не решения: такой результат не кэшируется; в ответы и БД не попадает
+    runner_failed: bool = Field(default=False, exclude=True)
 
 
 class UserOverviewResult(BaseModel):
@@ -1,8 +1,12 @@
 from pydantic import BaseModel, Field
 
+from src.config import settings
+
 class TaskCreation(BaseModel):
     title: str = Field(min_length=1, max_length=50)
     text: str = Field(min_length=1, max_length=500)
+    time_limit: float | None = Field(default=None, gt=0, le=settings.JUDGE_MAX_TIME_LIMIT)
+    memory_limit: int | None = Field(default=None, ge=16, le=settings.JUDGE_MAX_MEMORY_LIMIT_MB)
 
 
 class Tests(BaseModel):
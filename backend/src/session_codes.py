@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import string
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH  # 36^6 ~ 2.18 млрд
+CODE_BLOCK = 100  # сколько номеров процесс резервирует за одно обращение к sequence
+KEY_SIZE = 32
+
+
+class FeistelPermutation:
+    """Перестановка чисел [0, CODE_SPACE) - сеть Фейстеля на 32 битах с cycle walking.
+
+    Сеть Фейстеля биективна на [0, 2^32) при любом ключе; результат вне
+    [0, CODE_SPACE) прогоняется через сеть еще раз, пока не попадет в диапазон
+    (в среднем ~2 прохода), что сохраняет биективность на самом диапазоне.
+    Разные номера всегда дают разные коды, а без ключа коды не угадать по соседним
+    """
+
+    def __init__(self, key: bytes, rounds: int = 4):
+        self.key = key
+        self.rounds = rounds
+
+    def _round(self, index: int, half: int) -> int:
+        digest = hmac.new(self.key, bytes([index]) + half.to_bytes(2, "big"), hashlib.sha256).digest()
+        return int.from_bytes(digest[:2], "big")
+
+    def _permute32(self, value: int) -> int:
+        left, right = value >> 16, value & 0xFFFF
+        for index in range(self.rounds):
+            left, right = right, left ^ self._round(index, right)
+        return (left << 16) | right
+
+    def __call__(self, value: int) -> int:
+        if not 0 <= value < CODE_SPACE:
+            raise ValueError("пространство кодов сессий исчерпано")
+        value = self._permute32(value)
+        while value >= CODE_SPACE:
+            value = self._permute32(value)
+        return value
+
+
+def encode_code(value: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def load_key(path: Path) -> bytes:
+    """Ключ перестановки; создается заранее через load_or_create_key (serve.py)"""
+    key = path.read_bytes()
+    if len(key) != KEY_SIZE:
+        raise ValueError(f"{path}: ключ кодов сессий должен быть {KEY_SIZE} байта, а не {len(key)}")
+    return key
+
+
+def load_or_create_key(path: Path) -> bytes:
+    """Создает ключ через secrets, если его еще нет, и возвращает его.
+
+    Ключ пишется во временный файл и переносится на место одним os.replace,
+    поэтому читатель никогда не видит пустой или недописанный ключ
+    """
+    if path.exists():
+        return load_key(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    key = secrets.token_bytes(KEY_SIZE)
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(key)
+        key_file.flush()
+        os.fsync(key_file.fileno())
+    os.replace(temp_path, path)
+    return key
+
+
+class SessionCodeAllocator:
+    """Выдает уникальные коды сессий без проверок в БД.
+
+    Номера берутся из sequence блоками по CODE_BLOCK (одно обращение к БД на блок),
+    код - перестановка номера. Sequence никогда не выдает номер дважды,
+    поэтому коды не повторяются и повторные попытки вставки не нужны
+    """
+
+    def __init__(self, permutation: FeistelPermutation, reserve_block: Callable[[], Awaitable[int]],
+                 block_size: int = CODE_BLOCK):
+        self.permutation = permutation
+        self.reserve_block = reserve_block
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                self._next = await self.reserve_block()
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+        return encode_code(self.permutation(value))
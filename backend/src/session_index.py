@@ -0,0 +1,138 @@
+import asyncio
+import contextvars
+import json
+import time
+
+from src.cache import TTLCache
+from src.config import settings
+from src.invalidation import cache_invalidator
+from src.redis_client import redis_client
+
+
+ACTIVE_SESSIONS_KEY = "sessions:active"
+ACTIVE_STATUSES = ("pending", "started")
+# метка завершенной сессии: восстановление из БД, начатое до завершения, не вернет ее в индекс.
+# Нужна только на время такой гонки - дальше БД сама отвечает, что сессия не активна
+TOMBSTONE_TTL = 3600
+
+
+def tombstone_key(unique_code: str) -> str:
+    return f"sessions:finished:{unique_code}"
+
+
+_RESTORE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+_restore = redis_client.register_script(_RESTORE_SCRIPT)
+
+
+class SessionIndex:
+    """unique_code -> данные активной (pending/started) сессии.
+
+    Источник правды для всех процессов - хеш в Redis, в нем только активные
+    сессии. Перед ним небольшой кэш в памяти процесса с коротким TTL, чтобы
+    волна подключений учеников к одной сессии не ходила даже в Redis
+    """
+
+    local = TTLCache(maxsize=settings.SESSION_INDEX_LOCAL_SIZE)
+
+    @staticmethod
+    async def add(unique_code: str, session_info: dict):
+        await redis_client.hset(ACTIVE_SESSIONS_KEY, unique_code, json.dumps(session_info))
+        await cache_invalidator.invalidate("session_index", unique_code)
+
+    @staticmethod
+    async def set_status(unique_code: str, session_info: dict):
+        if session_info["status"] in ACTIVE_STATUSES:
+            await SessionIndex.add(unique_code, session_info)
+        else:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(tombstone_key(unique_code), 1, ex=TOMBSTONE_TTL)
+                pipe.hdel(ACTIVE_SESSIONS_KEY, unique_code)
+                await pipe.execute()
+            await cache_invalidator.invalidate("session_index", unique_code)
+
+    @staticmethod
+    async def resolve(unique_code: str) -> dict | None:
+        """Данные активной сессии или None, если такой нет или она завершена"""
+        session_info = SessionIndex.local.get(unique_code)
+        if session_info is not None:
+            return session_info
+        cached = await redis_client.hget(ACTIVE_SESSIONS_KEY, unique_code)
+        if cached is not None:
+            session_info = json.loads(cached)
+        else:
+            # индекс мог быть потерян (перезапуск Redis) - восстанавливаем из БД
+            from src.db_action.queries import Users
+            session_info = await Users.get_active_session_info(unique_code=unique_code)
+            if session_info is None:
+                return None
+            # сессия могла завершиться между чтением из БД и этой записью
+            restored = await _restore(keys=[ACTIVE_SESSIONS_KEY, tombstone_key(unique_code)],
+                                      args=[unique_code, json.dumps(session_info)])
+            if not restored:
+                return None
+        SessionIndex.local.set(unique_code, session_info, expires_at=time.time() + settings.SESSION_INDEX_LOCAL_TTL)
+        return session_info
+
+
+# смена статуса сессии в одном процессе сразу сбрасывает локальный кэш остальных
+cache_invalidator.register("session_index", SessionIndex.local)
+
+
+class JoinBatcher:
+    """Копит подключения учеников и вставляет их в users одним многострочным INSERT.
+
+    Пачка уходит в БД, когда набралось max_batch подключений или прошло
+    max_delay секунд с первого из них; каждый join ждет свой id
+    """
+
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: list[tuple[int, str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def join(self, session_id: int, name: str) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((session_id, name, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # пустой контекст: пачка не должна использовать сессию БД запроса, который ее начал
+        task = asyncio.create_task(self._flush(batch), context=contextvars.Context())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    @staticmethod
+    async def _flush(batch: list[tuple[int, str, asyncio.Future]]):
+        from src.db_action.queries import Users
+        try:
+            user_ids = await Users.add_users(participants=[(session_id, name) for session_id, name, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), user_id in zip(batch, user_ids):
+            if not future.done():
+                future.set_result(user_id)
+
+
+join_batcher = JoinBatcher(max_batch=settings.JOIN_BATCH_SIZE, max_delay=settings.JOIN_BATCH_DELAY_MS / 1000)
@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+import logging
+import math
+import os
+
+from src.config import settings
+from src.redis_client import redis_client
+
+
+# корзины времени растут в геометрической прогрессии: медиана известна с точностью ~5%
+RUNTIME_BUCKET_RATIO = 1.1
+MIN_RUNTIME = 1e-4
+COMPACTION_LEASE_KEY = "task_stats:compaction_lease"
+
+
+logger = logging.getLogger(__name__)
+
+
+def runtime_bucket(seconds: float) -> int:
+    return math.floor(math.log(max(seconds, MIN_RUNTIME)) / math.log(RUNTIME_BUCKET_RATIO))
+
+
+def bucket_runtime(bucket: int) -> float:
+    # середина корзины в логарифмической шкале
+    return RUNTIME_BUCKET_RATIO ** (bucket + 0.5)
+
+
+def median_runtime(buckets: list[tuple[int, int]]) -> float | None:
+    """Медиана по гистограмме [(корзина, число замеров)], отсортированной по корзине"""
+    total = sum(count for _, count in buckets)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen * 2 >= total:
+            return bucket_runtime(bucket)
+    return None
+
+
+class StatsCompactor:
+    """Периодически сворачивает дневные агрегаты заданий старше TASK_STATS_DAILY_DAYS в месячные.
+
+    Запускается в каждом процессе API, выполняет работу тот, кто взял аренду в Redis
+    """
+
+    def __init__(self):
+        self._owner = f"{os.getpid()}"
+
+    async def compact(self) -> int:
+        from src.db_action.queries import Users
+        acquired = await redis_client.set(COMPACTION_LEASE_KEY, self._owner,
+                                          nx=True, ex=int(settings.TASK_STATS_COMPACTION_INTERVAL))
+        if not acquired:
+            return 0
+        cutoff = datetime.datetime.utcnow().date() - datetime.timedelta(days=settings.TASK_STATS_DAILY_DAYS)
+        return await Users.compact_task_stats(before=cutoff)
+
+    async def run(self):
+        """Запускается из lifespan приложения"""
+        while True:
+            try:
+                await self.compact()
+                await asyncio.sleep(settings.TASK_STATS_COMPACTION_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # БД или Redis недоступны - пробуем снова чуть позже
+                logger.warning("task stats compaction: %s", e)
+                await asyncio.sleep(60)
+
+
+stats_compactor = StatsCompactor()
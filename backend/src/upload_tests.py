@@ -0,0 +1,87 @@
+import csv
+import json
+from collections.abc import AsyncIterator
+
+from pydantic import ValidationError
+
+from src.schemas.incoming import Tests
+
+
+MAX_REPORTED_ERRORS = 100
+MAX_LINE_BYTES = 64 * 1024
+
+
+class LineTooLong(Exception):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Режет поток байтов на строки, держа в памяти только неполную последнюю строку"""
+    tail = b""
+    async for chunk in chunks:
+        tail += chunk
+        *lines, tail = tail.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode(errors="replace")
+        if len(tail) > MAX_LINE_BYTES:
+            raise LineTooLong()
+    if tail:
+        yield tail.rstrip(b"\r").decode(errors="replace")
+
+
+def _csv_cell(cell: str):
+    # 5 -> int, 1.5 -> float, true -> bool, всё остальное остается строкой
+    try:
+        value = json.loads(cell)
+    except ValueError:
+        return cell
+    return value if isinstance(value, (str, int, float, bool)) else cell
+
+
+def parse_jsonl(line: str) -> Tests:
+    return Tests.model_validate_json(line)
+
+
+def parse_csv(line: str) -> Tests:
+    row = next(csv.reader([line]))
+    if len(row) != 2:
+        raise ValueError("ожидается два столбца: input,output")
+    return Tests(input=_csv_cell(row[0]), output=_csv_cell(row[1]))
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors: list[dict] = []
+
+    def add_error(self, line_number: int, error: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": error})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "error_count": self.error_count, "errors": self.errors}
+
+
+async def iter_tests(lines: AsyncIterator[str], fmt: str, report: ImportReport) -> AsyncIterator[Tests]:
+    """Валидирует строки загрузки, ошибки складывает в report и пропускает строку"""
+    parse = parse_csv if fmt == "csv" else parse_jsonl
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv" and line_number == 1 and line.replace(" ", "").lower() == "input,output":
+            continue
+        try:
+            test = parse(line)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(map(str, error["loc"]))
+            report.add_error(line_number, f"{location}: {error['msg']}" if location else error["msg"])
+            continue
+        except (ValueError, csv.Error) as e:
+            report.add_error(line_number, str(e))
+            continue
+        yield test
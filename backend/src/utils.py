@@ -1,14 +1,20 @@
 import jwt
 import bcrypt
+import asyncio
+import base64
 import datetime
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 from jwt import InvalidTokenError
 from fastapi import Form, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
-import random
-import string
 
 from src.database import async_engine, Base
-from .config import settings
+from src.cache import TTLCache
+from src.metrics import JWT_DURATION, PASSWORD_HASH_DURATION, timed
+from src.schemas.from_dbDTO import TeacherInfo
+from src.config import settings
 
 #database creation
 async def create_tables():
@@ -16,24 +22,38 @@ async def create_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
-def generate_unique_code():
-    # Define possible characters: uppercase letters and digits.
-    characters = string.ascii_uppercase + string.digits
-    # Generate a random code of 6 characters.
-    code = ''.join(random.choices(characters, k=6))
-    return code
+# bcrypt отпускает GIL, поэтому потоки реально хешируют параллельно на разных ядрах
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count(),
+                                       thread_name_prefix="bcrypt")
+
+
+def encode_cursor(time_created: datetime.datetime, id: int) -> str:
+    """Курсор keyset-пагинации: позиция последней выданной строки"""
+    raw = f"{time_created.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Обратное к encode_cursor, ValueError на некорректный курсор"""
+    try:
+        time_created, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(time_created), int(id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
 
 
 class PasswordActions:
     @staticmethod
-    def hash(password: str) -> str:
+    @timed(PASSWORD_HASH_DURATION, "hash")
+    def hash(password: str, rounds: int = settings.BCRYPT_ROUNDS) -> str:
         """Генерирует хеш пароля в формате строки"""
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=rounds)
         pwd_bytes: bytes = password.encode()
         hashed = bcrypt.hashpw(pwd_bytes, salt)
         return hashed.decode('utf-8')  # Конвертируем байты в строку
 
     @staticmethod
+    @timed(PASSWORD_HASH_DURATION, "validate")
     def validate(password: str, hashed_password: str) -> bool:
         """Проверяет соответствие пароля хешу"""
         return bcrypt.checkpw(
@@ -41,11 +61,29 @@ class PasswordActions:
             hashed_password=hashed_password.encode('utf-8')  # Конвертируем обратно в байты
         )
 
+    @staticmethod
+    def needs_rehash(hashed_password: str, rounds: int = settings.BCRYPT_ROUNDS) -> bool:
+        """Хеш вида $2b$12$... создан с другой стоимостью, чем текущая"""
+        return int(hashed_password.split('$')[2]) != rounds
+
+    @staticmethod
+    async def hash_async(password: str) -> str:
+        """hash в пуле потоков, не блокирует цикл событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, PasswordActions.hash, password)
+
+    @staticmethod
+    async def validate_async(password: str, hashed_password: str) -> bool:
+        """validate в пуле потоков, не блокирует цикл событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, PasswordActions.validate, password, hashed_password)
+
 
 class JWTActions:
     @staticmethod
+    @timed(JWT_DURATION, "encode")
     def encode(payload: dict,
-               private_key: str = settings.auth_jwt.private_key_path.read_text(), 
+               private_key=settings.auth_jwt.private_key_obj,
                algorithm: str = settings.auth_jwt.algorithm,
                expire_timedelta: datetime.timedelta | None = None,
                expire_minutes: int = settings.auth_jwt.access_token_expire_minutes
@@ -61,8 +99,9 @@ class JWTActions:
         return encoded
 
     @staticmethod
+    @timed(JWT_DURATION, "decode")
     def decode(token: str | bytes, 
-               public_key: str = settings.auth_jwt.public_key_path.read_text(), 
+               public_key=settings.auth_jwt.public_key_obj,
                algorithm: str = settings.auth_jwt.algorithm
                ):
         decoded = jwt.decode(token, public_key, algorithms=[algorithm])
@@ -71,6 +110,9 @@ class JWTActions:
 
 class AuthActions:
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/teachers/login")
+    participant_scheme = HTTPBearer()
+    # sha256(токен) -> TeacherInfo, запись живет до exp токена
+    token_cache = TTLCache(maxsize=settings.auth_jwt.token_cache_size)
 
     @staticmethod
     def get_current_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
@@ -86,11 +128,37 @@ class AuthActions:
         return payload
     
     @staticmethod
-    async def validate_user(token: str) -> bool:
-        from .db_action.queries import Users
+    async def validate_user(token: str) -> TeacherInfo:
+        """Проверяет токен и возвращает данные преподавателя.
+
+        Проверенные токены кэшируются до истечения exp, поэтому повторные
+        запросы с тем же токеном не проверяют подпись RSA и не ходят в БД
+        """
+        from src.db_action.queries import Users
+        token_hash = hashlib.sha256(token.encode()).digest()
+        teacher_info = AuthActions.token_cache.get(token_hash)
+        if teacher_info is not None:
+            return teacher_info
         payload = AuthActions.get_current_token_payload(token=token)
-        user_email = payload['sub']
-        user_exists = await Users.check_teacher_uniqueness_and_return_password(user_email=user_email)
-        if bool(user_exists):
-            return True
-        raise HTTPException(status_code=403, detail="Пользователь не авторизован")
\ No newline at end of file
+        teacher_info = await Users.get_teacher_info_by_email(teacher_email=payload['sub'])
+        if teacher_info is None:
+            raise HTTPException(status_code=403, detail="Пользователь не авторизован")
+        AuthActions.token_cache.set(token_hash, teacher_info, expires_at=payload['exp'])
+        return teacher_info
+
+    @staticmethod
+    def issue_participant_token(user_id: int, session_id: int) -> str:
+        """Токен ученика, выдается при подключении к сессии"""
+        return JWTActions.encode({"sub": str(user_id), "sid": session_id, "type": "participant"},
+                                 expire_minutes=settings.auth_jwt.participant_token_expire_minutes)
+
+    @staticmethod
+    def validate_participant(credentials: HTTPAuthorizationCredentials = Depends(participant_scheme)) -> int:
+        """user_id ученика из токена issue_participant_token"""
+        try:
+            payload = JWTActions.decode(token=credentials.credentials)
+        except InvalidTokenError as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"invalid token error: {e}")
+        if payload.get("type") != "participant":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Нужен токен участника сессии")
+        return int(payload["sub"])
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import logging
+import time
+
+from sqlalchemy import text
+
+from src.config import settings
+from src.database import async_engine
+from src.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+async def _ping_db():
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _preload_task_info() -> int:
+    """Кэш view_task_info для заданий активных сессий - их открывают во время урока"""
+    from src.db_action.queries import Users
+    from src.session_index import ACTIVE_SESSIONS_KEY
+
+    sessions = await redis_client.hvals(ACTIVE_SESSIONS_KEY)
+    task_ids = list(dict.fromkeys(json.loads(raw)["task_id"] for raw in sessions))[:settings.WARMUP_TASKS]
+    for task_id in task_ids:
+        await Users.view_task_info_json(task_id=task_id)
+    return len(task_ids)
+
+
+async def warmup():
+    """Прогрев процесса API до приема запросов: соединения с БД и Redis, криптография JWT,
+    кэш заданий активных сессий.
+
+    Соединения открываются параллельно, поэтому в пуле остается WARMUP_CONNECTIONS готовых.
+    Ошибки только пишутся в лог - процесс все равно стартует и дозвонится при первом запросе
+    """
+    from src.utils import JWTActions
+
+    started = time.perf_counter()
+    connections = min(settings.WARMUP_CONNECTIONS, settings.DB_POOL_SIZE)
+    results = await asyncio.gather(
+        *(_ping_db() for _ in range(connections)),
+        *(redis_client.ping() for _ in range(connections)),
+        return_exceptions=True,
+    )
+    for error in {str(result) for result in results if isinstance(result, Exception)}:
+        logger.warning("warmup: %s", error)
+    # первая подпись и проверка RSA подгружают бэкенд cryptography
+    JWTActions.decode(JWTActions.encode({"sub": "warmup"}))
+    try:
+        preloaded = await _preload_task_info()
+    except Exception as e:
+        preloaded = 0
+        logger.warning("warmup: %s", e)
+    opened = sum(not isinstance(result, Exception) for result in results)
+    logger.info("warmup: %d/%d connections (db + redis), %d tasks cached in %.2fs",
+                opened, len(results), preloaded, time.perf_counter() - started)
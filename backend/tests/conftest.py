@@ -0,0 +1,28 @@
+import os
+import tempfile
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# src.config требует настройки БД; сами тесты к БД и Redis не подключаются
+for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_USER": "test",
+                    "DB_PASS": "test", "DB_NAME": "test"}.items():
+    os.environ.setdefault(name, value)
+
+from src.config import settings  # noqa: E402
+
+
+def _use_temporary_jwt_keys():
+    """pems/ не хранится в репозитории, а src.utils читает ключи JWT при импорте - тестам своя пара"""
+    directory = Path(tempfile.mkdtemp(prefix="jwt-keys-"))
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    settings.auth_jwt.private_key_path = directory / "jwt-private.pem"
+    settings.auth_jwt.public_key_path = directory / "jwt-public.pem"
+    settings.auth_jwt.private_key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    settings.auth_jwt.public_key_path.write_bytes(key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+
+
+_use_temporary_jwt_keys()
@@ -0,0 +1,88 @@
+from src.judge import checker
+from src.judge.checker import check_all, check_output, compare_tokens, iter_token_chunks
+from src.schemas import from_dbDTO
+
+
+def make_test(output, output_type="str") -> from_dbDTO.Tests:
+    return from_dbDTO.Tests(input="", output=output, input_type="str", output_type=output_type)
+
+
+def test_float_within_tolerance():
+    assert check_output("0.3000000001\n", 0.3, "float").passed
+    assert check_output("1000000.5", 1000000.0, "float").passed  # относительная погрешность
+    assert not check_output("0.31", 0.3, "float").passed
+
+
+def test_float_nan_and_garbage():
+    assert check_output("nan", float("nan"), "float").passed
+    assert not check_output("1.0", float("nan"), "float").passed
+    result = check_output("abc", 1.5, "float")
+    assert not result.passed and "ожидалось число" in result.message
+
+
+def test_numbers_in_text_answer_use_tolerance():
+    assert check_output("x 1.0000000001 y", "x 1 y", "str").passed
+    assert not check_output("x 1.1 y", "x 1 y", "str").passed
+
+
+def test_text_tokens_compare_numerically_only_when_plain_numbers():
+    assert check_output("2.50 1e3", "2.5 1000", "str").passed
+    assert not check_output("0001", "1", "str").passed
+    assert not check_output("1", "01", "str").passed
+    assert not check_output("1_000", "1000", "str").passed
+    assert not check_output("inf", "Infinity", "str").passed
+    assert check_output("nan 0001", "nan 0001", "str").passed  # как текст совпадают
+
+
+def test_int_and_bool():
+    assert check_output(" 42 \n", 42, "int").passed
+    assert not check_output("42 43", 42, "int").passed
+    assert check_output("YES", True, "bool").passed
+    assert check_output("0", False, "bool").passed
+    assert not check_output("maybe", True, "bool").passed
+
+
+def test_crlf_output():
+    assert check_output("1 2\r\n3\r\n", "1 2\n3\n", "str").passed
+    assert check_output("1 2\r\n3\r\n", "1 2\n3", "str").passed
+    assert not check_output("1 2\r\n4\r\n", "1 2\n3\n", "str").passed
+
+
+def test_whitespace_is_equivalent():
+    assert check_output("1\t2\n\n3   ", "1 2 3", "str").passed
+
+
+def test_truncated_output():
+    expected = " ".join(map(str, range(1000)))
+    result = check_output(expected[:expected.rindex(" ")], expected, "str")
+    assert not result.passed
+    assert result.message == "вывод закончился раньше, ожидалось '999'"
+    assert not check_output("", "1", "str").passed
+    assert check_output("", 1, "int").message == "пустой вывод"
+
+
+def test_extra_output():
+    result = check_output("1 2 3", "1 2", "str")
+    assert not result.passed and result.message == "токен 3: лишний вывод '3'"
+
+
+def test_chunks_do_not_cut_tokens():
+    text = "alpha beta gamma delta " * 50
+    chunks = list(iter_token_chunks(text, chunk_size=7))
+    assert [token for chunk in chunks for token in chunk] == text.split()
+
+
+def test_mismatch_position_across_chunks():
+    # вывод длиннее нескольких кусков по CHUNK_SIZE, куски у вывода и ответа режутся по-разному
+    expected = " ".join(map(str, range(30000)))
+    assert len(expected) > 2 * checker.CHUNK_SIZE
+    got = expected.replace(" 25000 ", "  25001\n")
+    result = compare_tokens(got, expected)
+    assert result.message == "токен 25001: ожидалось '25000', получено '25001'"
+
+
+def test_check_all_skips_missing_outputs_and_reuses_results():
+    tests = [make_test(5, "int"), make_test(5, "int"), make_test("a b")]
+    results = check_all(["5\n", "5\n", None], tests)
+    assert results[0].passed and results[1] is results[0]
+    assert results[2] is None
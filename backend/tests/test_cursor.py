@@ -0,0 +1,39 @@
+import base64
+import datetime
+
+import pytest
+
+from src.utils import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("time_created", [
+    datetime.datetime(2024, 9, 1, 8, 30),
+    datetime.datetime(2024, 9, 1, 8, 30, 15, 123456),
+    datetime.datetime(2024, 9, 1, 8, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=3))),
+])
+def test_round_trip(time_created):
+    cursor = encode_cursor(time_created, 42)
+    assert decode_cursor(cursor) == (time_created, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime.datetime(2024, 9, 1, 8, 30, 15, 999999), 2 ** 40)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    _b64(b"2024-09-01T08:30:00"),
+    _b64(b"2024-09-01T08:30:00|42|1"),
+    _b64(b"yesterday|42"),
+    _b64(b"2024-09-01T08:30:00|x"),
+    _b64(b"\xff\xfe|1"),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        decode_cursor(cursor)
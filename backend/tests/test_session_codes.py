@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from src.session_codes import CODE_ALPHABET, CODE_LENGTH, CODE_SPACE, FeistelPermutation, encode_code
+
+
+KEY = bytes(range(32))
+
+
+def unpermute32(permutation: FeistelPermutation, value: int) -> int:
+    """Обратная сеть Фейстеля: раунды в обратном порядке"""
+    left, right = value >> 16, value & 0xFFFF
+    for index in reversed(range(permutation.rounds)):
+        left, right = right ^ permutation._round(index, left), left
+    return (left << 16) | right
+
+
+def invert(permutation: FeistelPermutation, code: int) -> int:
+    """Обратное к cycle walking: обратная сеть, пока значение не вернется в [0, CODE_SPACE)"""
+    value = unpermute32(permutation, code)
+    while value >= CODE_SPACE:
+        value = unpermute32(permutation, value)
+    return value
+
+
+@pytest.fixture(scope="module")
+def permutation() -> FeistelPermutation:
+    return FeistelPermutation(KEY)
+
+
+def test_network_is_invertible(permutation):
+    rng = random.Random(1)
+    for value in (0, 1, 0xFFFF, 0x10000, 2 ** 32 - 1, *(rng.randrange(2 ** 32) for _ in range(2000))):
+        assert unpermute32(permutation, permutation._permute32(value)) == value
+
+
+def test_bijection_on_domain(permutation):
+    # перебрать все 36^6 номеров долго: проверяем, что у каждого кода из выборки единственный прообраз
+    rng = random.Random(2)
+    values = [*range(5000), *range(CODE_SPACE - 5000, CODE_SPACE), *(rng.randrange(CODE_SPACE) for _ in range(5000))]
+    codes = [permutation(value) for value in values]
+    assert all(0 <= code < CODE_SPACE for code in codes)
+    assert len(set(codes)) == len(set(values))
+    assert all(invert(permutation, code) == value for value, code in zip(values, codes))
+
+
+def test_consecutive_numbers_are_scattered(permutation):
+    codes = [permutation(value) for value in range(100)]
+    assert codes != sorted(codes)
+
+
+def test_other_key_gives_other_codes(permutation):
+    other = FeistelPermutation(bytes(32))
+    assert [permutation(value) for value in range(20)] != [other(value) for value in range(20)]
+
+
+@pytest.mark.parametrize("value", [-1, CODE_SPACE])
+def test_out_of_domain(permutation, value):
+    with pytest.raises(ValueError):
+        permutation(value)
+
+
+def test_encode_code():
+    assert encode_code(0) == CODE_ALPHABET[0] * CODE_LENGTH
+    assert encode_code(CODE_SPACE - 1) == CODE_ALPHABET[-1] * CODE_LENGTH
+    assert encode_code(len(CODE_ALPHABET) + 1) == "AAAABB"
@@ -0,0 +1,39 @@
+import pytest
+
+from src.task_stats import MIN_RUNTIME, RUNTIME_BUCKET_RATIO, bucket_runtime, median_runtime, runtime_bucket
+
+
+@pytest.mark.parametrize("seconds", [0.0005, 0.013, 0.25, 1.0, 1.9, 12.0])
+def test_bucket_contains_runtime(seconds):
+    # середина корзины отличается от замера не больше чем в sqrt(RATIO) раз
+    ratio = bucket_runtime(runtime_bucket(seconds)) / seconds
+    assert RUNTIME_BUCKET_RATIO ** -0.5 <= ratio <= RUNTIME_BUCKET_RATIO ** 0.5
+
+
+def test_bucket_is_monotonic():
+    runtimes = [0.001 * 1.03 ** i for i in range(200)]
+    buckets = [runtime_bucket(seconds) for seconds in runtimes]
+    assert buckets == sorted(buckets)
+
+
+def test_tiny_runtimes_share_lowest_bucket():
+    assert runtime_bucket(0.0) == runtime_bucket(MIN_RUNTIME / 10) == runtime_bucket(MIN_RUNTIME)
+
+
+def test_median_empty():
+    assert median_runtime([]) is None
+
+
+def test_median_single_bucket():
+    assert median_runtime([(5, 3)]) == bucket_runtime(5)
+
+
+def test_median_odd_and_even():
+    assert median_runtime([(1, 1), (2, 1), (3, 1)]) == bucket_runtime(2)
+    # при четном числе замеров - нижняя из двух средних корзин
+    assert median_runtime([(1, 2), (4, 2)]) == bucket_runtime(1)
+
+
+def test_median_skewed_histogram():
+    buckets = [(runtime_bucket(0.01), 10), (runtime_bucket(0.1), 30), (runtime_bucket(2.0), 20)]
+    assert median_runtime(buckets) == pytest.approx(0.1, rel=RUNTIME_BUCKET_RATIO - 1)
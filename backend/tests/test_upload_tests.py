@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from src import upload_tests
+from src.upload_tests import ImportReport, LineTooLong, iter_lines, iter_tests
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+def parse(fmt: str, *chunks: bytes) -> tuple[list, ImportReport]:
+    report = ImportReport()
+    tests = asyncio.run(_collect(iter_tests(iter_lines(_chunks(*chunks)), fmt, report)))
+    return [(test.input, test.output) for test in tests], report
+
+
+def test_lines_split_across_chunks_and_crlf():
+    lines = asyncio.run(_collect(iter_lines(_chunks(b"a,", b"b\r\nc", b",d\r", b"\n", b"e,f"))))
+    assert lines == ["a,b", "c,d", "e,f"]
+
+
+def test_invalid_utf8_is_replaced():
+    assert asyncio.run(_collect(iter_lines(_chunks(b"\xff1,2\n")))) == ["�1,2"]
+
+
+def test_line_too_long(monkeypatch):
+    monkeypatch.setattr(upload_tests, "MAX_LINE_BYTES", 10)
+    with pytest.raises(LineTooLong):
+        asyncio.run(_collect(iter_lines(_chunks(b"1,2\n", b"x" * 11))))
+
+
+def test_csv_header_blank_lines_and_types():
+    tests, report = parse("csv", b"Input, Output\n1 2,3\n\n\"a,b\",true\n1.5,\"[1, 2]\"\n")
+    assert tests == [("1 2", 3), ("a,b", True), (1.5, "[1, 2]")]
+    assert report.error_count == 0
+
+
+def test_csv_header_only_on_first_line():
+    tests, _ = parse("csv", b"1,2\ninput,output\n")
+    assert tests == [(1, 2), ("input", "output")]
+
+
+def test_csv_wrong_column_count():
+    tests, report = parse("csv", b"1,2\n1,2,3\n4\n5,6\n")
+    assert tests == [(1, 2), (5, 6)]
+    assert [error["line"] for error in report.errors] == [2, 3]
+    assert report.errors[0]["error"] == "ожидается два столбца: input,output"
+
+
+def test_jsonl_valid_and_invalid_lines():
+    body = (b'{"input": "1 2", "output": 3}\r\n'
+            b'not json\n'
+            b'{"input": "1"}\n'
+            b'{"input": [1], "output": 2}\n'
+            b'\n'
+            b'{"input": false, "output": "x"}')
+    tests, report = parse("jsonl", body)
+    assert tests == [("1 2", 3), (False, "x")]
+    assert [error["line"] for error in report.errors] == [2, 3, 4]
+    assert report.errors[1]["error"].startswith("output:")
+
+
+def test_errors_are_capped(monkeypatch):
+    monkeypatch.setattr(upload_tests, "MAX_REPORTED_ERRORS", 3)
+    tests, report = parse("jsonl", b"x\n" * 10)
+    assert tests == []
+    assert report.error_count == 10 and len(report.errors) == 3